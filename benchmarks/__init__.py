@@ -0,0 +1,11 @@
+"""
+Benchmarks for chatviz, run as modules from the root of the repository, e.g.
+
+    python -m benchmarks.bench_whatsapp
+
+`benchmarks.suite` runs every loader and plot on synthetic chats from
+`benchmarks.synthetic`, and exits with an error if any is slower or uses
+more memory than in baselines.json:
+
+    python -m benchmarks.suite --messages 10000 100000
+"""
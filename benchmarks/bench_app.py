@@ -0,0 +1,71 @@
+"""
+Times the notebook app from an upload to a rendered dashboard, and each
+change of its options after that, against drawing a new visualize_chat
+for every change as it used to.
+
+    python -m benchmarks.bench_app --messages 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+
+from benchmarks.synthetic import iter_chat, write_whatsapp  # noqa: E402
+from chatviz import app  # noqa: E402
+from chatviz.load_data import prep_whatsapp_data  # noqa: E402
+from chatviz.main import visualize_chat  # noqa: E402
+
+STEPS = [
+    ("upload", {}),
+    ("same upload", {}),
+    ("title", {"title": "Flying Circus"}),
+    ("timeline_freq", {"timeline_freq": "W"}),
+    ("top_n_words", {"top_n_words": 5}),
+    ("colors", {"colors": ["C1", "C2", "C3", "C4", "C5"]}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the app")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "chat.txt")
+        write_whatsapp(iter_chat(args.messages), filename)
+        with open(filename, "rb") as f:
+            content = f.read()
+
+        options = dict(
+            title="Example Plot", colors="default", timeline_freq="MS", top_n_words=10
+        )
+        for label, change in STEPS:
+            options.update(change)
+            start = time.perf_counter()
+            # as app.visualize, with the figure rendered rather than displayed
+            fig = app._get_session(content, "WhatsApp").draw(**options)
+            fig.canvas.draw()
+            elapsed = time.perf_counter() - start
+            print("{:<8} {:<16} {:>8.3f}s".format("app", label, elapsed))
+
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            fig = visualize_chat(
+                prep_whatsapp_data(filename), "Example Plot", timeline_color="C0"
+            )
+            fig.canvas.draw()
+            plt.close(fig)
+            elapsed = time.perf_counter() - start
+            print("{:<8} {:<16} {:>8.3f}s".format("legacy", "every change", elapsed))
+
+
+if __name__ == "__main__":
+    main()
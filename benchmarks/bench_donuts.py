@@ -0,0 +1,63 @@
+"""
+Compares the time to count the words and characters of each person, as in
+plot_donuts, with the per message loops it replaced.
+
+    python -m benchmarks.bench_donuts --messages 10000000
+"""
+
+import argparse
+import re
+import time
+
+from benchmarks.synthetic import generate_chat
+from chatviz.load_data import normalize_chat_data
+from chatviz.stats import ChatStats
+
+
+def legacy_counts(df):
+    words = df.groupby("name", observed=True)["text"].aggregate(
+        lambda x: sum(
+            len(re.sub(r"[^a-zA-Z0-9]+", " ", i).strip().split()) for i in x.fillna("")
+        )
+    )
+    chars = df.groupby("name", observed=True)["text"].aggregate(
+        lambda x: sum(len(i) for i in x.fillna(""))
+    )
+    return words, chars
+
+
+def stats_counts(df):
+    stats = ChatStats(df)
+    return stats.word_counts, stats.char_counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000000)
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="only time ChatStats"
+    )
+    args = parser.parse_args()
+
+    df = normalize_chat_data(generate_chat(args.messages))
+    funcs = [("ChatStats", stats_counts)]
+    if not args.skip_legacy:
+        funcs.insert(0, ("legacy", legacy_counts))
+    results = []
+    for label, func in funcs:
+        start = time.perf_counter()
+        results.append(func(df))
+        elapsed = time.perf_counter() - start
+        print(
+            "{:<12} {:>10} rows {:>8.2f}s {:>14,.0f} rows/s".format(
+                label, len(df), elapsed, len(df) / elapsed
+            )
+        )
+    words, chars = results[-1]
+    for other_words, other_chars in results[:-1]:
+        assert (other_words.sort_index() == words.sort_index()).all()
+        assert (other_chars.sort_index() == chars.sort_index()).all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Times computing every aggregate of a ChatStats with an increasing number of
+processes.
+
+    python -m benchmarks.bench_parallel --messages 10000000 --jobs 1 2 4 8
+"""
+
+import argparse
+import time
+
+from benchmarks.synthetic import generate_chat
+from chatviz.load_data import normalize_chat_data
+from chatviz.stats import ChatStats
+
+AGGREGATES = [
+    "message_counts",
+    "word_counts",
+    "char_counts",
+    "hour_counts",
+    "weekday_counts",
+    "reply_times",
+    "word_counters",
+]
+
+
+def aggregate(df, n_jobs):
+    stats = ChatStats(df, n_jobs=n_jobs)
+    for attribute in AGGREGATES:
+        getattr(stats, attribute)
+    stats.timeline()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000000)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    df = normalize_chat_data(generate_chat(args.messages))
+    serial = None
+    for n_jobs in args.jobs:
+        start = time.perf_counter()
+        aggregate(df, n_jobs)
+        elapsed = time.perf_counter() - start
+        if serial is None:
+            serial = elapsed
+        print(
+            "n_jobs={:<4} {:>10} rows {:>8.2f}s {:>6.2f}x".format(
+                n_jobs, len(df), elapsed, serial / elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares the time to bin and draw a daily timeline, as in plot_timeline,
+with the groupby and pandas bar chart it replaced.
+
+    python -m benchmarks.bench_timeline --messages 4000000 --people 20
+"""
+
+import argparse
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.synthetic import generate_chat  # noqa: E402
+from chatviz.load_data import normalize_chat_data  # noqa: E402
+from chatviz.plotting import plot_timeline  # noqa: E402
+
+
+def legacy_timeline(df, freq):
+    df = df.copy()
+    counts = (
+        df.groupby([pd.Grouper(key="date", freq=freq), "name"])["text"]
+        .count()
+        .unstack()
+        .fillna(0)
+        .resample(freq)
+        .sum()
+    )
+    ax = plt.subplot(111)
+    counts.plot(kind="bar", stacked=True, width=0.75, ax=ax, rot=45)
+    return ax
+
+
+def stats_timeline(df, freq):
+    return plot_timeline(df, freq=freq, stacked=True, tick_step=365)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=4000000)
+    parser.add_argument("--people", type=int, default=20)
+    parser.add_argument("--freq", default="D")
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="only time plot_timeline"
+    )
+    args = parser.parse_args()
+
+    # about 8 years of messages at the default size
+    df = normalize_chat_data(generate_chat(args.messages, n_people=args.people))
+    funcs = [("plot_timeline", stats_timeline)]
+    if not args.skip_legacy:
+        funcs.insert(0, ("legacy", legacy_timeline))
+    for label, func in funcs:
+        start = time.perf_counter()
+        ax = func(df, args.freq)
+        ax.figure.savefig("/dev/null", format="png")
+        elapsed = time.perf_counter() - start
+        print(
+            "{:<14} {:>10} rows {:>6} artists {:>8.2f}s".format(
+                label, len(df), len(ax.patches), elapsed
+            )
+        )
+        plt.close(ax.figure)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares the rows per second of prep_whatsapp_data with the line by line
+parser it replaced.
+
+    python -m benchmarks.bench_whatsapp --messages 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_chat, write_whatsapp
+from chatviz.load_data import prep_whatsapp_data
+
+
+def legacy_prep_whatsapp_data(filename):
+    data = []
+    with open(filename, "r") as f:
+        for line in list(f)[1:]:
+            line = line.strip()
+            if line.endswith("<Media omitted>"):
+                continue
+            try:
+                date, rest = line.split(" - ", 1)
+            except ValueError:
+                continue
+            name, text = rest.split(": ", 1)
+            data.append([date, name, text])
+    df = pd.DataFrame(data, columns=["date", "name", "text"])
+    df["date"] = pd.to_datetime(df["date"], dayfirst=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "chat.txt")
+        write_whatsapp(generate_chat(args.messages), filename)
+        for label, func in [
+            ("legacy", legacy_prep_whatsapp_data),
+            ("prep_whatsapp_data", prep_whatsapp_data),
+        ]:
+            start = time.perf_counter()
+            df = func(filename)
+            elapsed = time.perf_counter() - start
+            print(
+                "{:<20} {:>10} rows {:>8.2f}s {:>12,.0f} rows/s".format(
+                    label, len(df), elapsed, len(df) / elapsed
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares the time to count the donuts, radars and timeline of a window of a
+chat, as when scrubbing through it, from the running totals of a Chat with
+filtering the messages and counting them again.
+
+    python -m benchmarks.bench_window --messages 1000000 --windows 50
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_chat
+from chatviz import Chat, ChatStats
+
+
+def count(stats, freq):
+    # everything the donuts, radars and timeline of the dashboard use
+    for attribute in [
+        "message_counts",
+        "word_counts",
+        "char_counts",
+        "hour_counts",
+        "weekday_counts",
+    ]:
+        getattr(stats, attribute)
+    stats.timeline(freq)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--people", type=int, default=5)
+    parser.add_argument("--windows", type=int, default=50)
+    parser.add_argument("--width", default="365D", help="the length of each window")
+    parser.add_argument("--freq", default="MS")
+    args = parser.parse_args()
+
+    df = generate_chat(args.messages, n_people=args.people)
+    width = pd.Timedelta(args.width)
+    starts = pd.date_range(
+        df["date"].iloc[0], df["date"].iloc[-1] - width, periods=args.windows
+    )
+
+    start = time.perf_counter()
+    chat = Chat(df)
+    chat.stats
+    print(
+        "{:<24} {:>8.3f}s".format(
+            "Chat and running totals", time.perf_counter() - start
+        )
+    )
+    start = time.perf_counter()
+    for window_start in starts:
+        count(chat.between(window_start, window_start + width).stats, args.freq)
+    elapsed = (time.perf_counter() - start) / len(starts)
+    print("{:<24} {:>8.3f}s".format("Chat window", elapsed))
+
+    start = time.perf_counter()
+    for window_start in starts[:3]:
+        in_window = (df["date"] >= window_start) & (df["date"] < window_start + width)
+        count(ChatStats(df[in_window]), args.freq)
+    elapsed = (time.perf_counter() - start) / min(3, len(starts))
+    print("{:<24} {:>8.3f}s".format("filter and ChatStats", elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Times and measures the peak memory of every loader, plot and visualize_chat
+on synthetic chats, and fails if any got slower or bigger than its baseline.
+
+    python -m benchmarks.suite --messages 10000 100000
+    python -m benchmarks.suite --messages 10000 --update
+
+Each case runs in a new interpreter, so that its peak memory is its own. The
+peak is the most memory the case used above what its inputs took, read from
+the high water mark of the process on Linux, and from tracemalloc elsewhere,
+which misses memory pandas holds in Arrow buffers. Times are the best of a few
+runs. The baselines in baselines.json are from one machine, so update them
+with --update when running on another.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import EXTENSIONS, write_chat
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+LOADERS = ["whatsapp", "facebook", "sms", "csv"]
+PLOTS = [
+    "plot_donuts",
+    "plot_timeline",
+    "plot_reply_times",
+    "plot_hours_radar",
+    "plot_days_radar",
+    "plot_hour_weekday_heatmap",
+    "plot_words",
+]
+CASES = ["load_" + f for f in LOADERS] + PLOTS + ["visualize_chat"]
+
+
+def _chat_path(data_dir, chat_format, n_messages):
+    name = "chat_{}{}".format(n_messages, EXTENSIONS[chat_format])
+    return os.path.join(data_dir, chat_format, name)
+
+
+def _write_chats(data_dir, n_messages):
+    """
+    Writes the chat in every format, unless a previous run already has.
+    """
+    for chat_format in LOADERS:
+        path = _chat_path(data_dir, chat_format, n_messages)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written to one side first, so an interrupted run isn't reused
+            partial = path + ".partial"
+            write_chat(chat_format, partial, n_messages)
+            os.replace(partial, path)
+
+
+def _setup(case, data_dir, n_messages):
+    """
+    Returns the function to benchmark for case, with its inputs ready.
+    """
+    if case.startswith("load_"):
+        from chatviz.batch import LOADERS as loaders
+
+        chat_format = case[len("load_") :]
+        path = _chat_path(data_dir, chat_format, n_messages)
+        loader = loaders[chat_format]
+        return lambda: loader(path)
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from chatviz import plotting, visualize_chat
+    from chatviz.batch import LOADERS as loaders
+    from chatviz.utils import STOPWORDS
+
+    df = loaders["csv"](_chat_path(data_dir, "csv", n_messages))
+    if case == "visualize_chat":
+
+        def plot():
+            return visualize_chat(
+                df, "Benchmark", stopwords=STOPWORDS, timeline_color="C0"
+            )
+
+    else:
+        plot_function = getattr(plotting, case)
+
+        def plot():
+            plt.figure(figsize=(30, 40) if case == "plot_words" else (12, 8))
+            plot_function(df)
+            return plt.gcf()
+
+    def draw():
+        # drawing is most of the cost of big plots, so it is counted too
+        fig = plot()
+        fig.canvas.draw()
+        plt.close(fig)
+
+    return draw
+
+
+def _status(key):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(key)
+
+
+def _measure_peak(func):
+    """
+    Returns the most bytes func used above what was in use before it ran.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            # resets the high water mark of the process to its current size
+            f.write("5")
+        before = _status("VmRSS")
+    except OSError:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+    func()
+    return max(_status("VmHWM") - before, 0)
+
+
+def run_case(case, data_dir, n_messages, repeat):
+    """
+    Benchmarks one case in this process, returning its best time in seconds
+    and peak memory in MB.
+    """
+    func = _setup(case, data_dir, n_messages)
+    # measured on the first run, as later ones reuse memory which the
+    # allocator kept from it
+    peak_mb = _measure_peak(func) / 2**20
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"seconds": round(min(times), 4), "peak_mb": round(peak_mb, 1)}
+
+
+def compare(results, baselines, time_tolerance=0.5, memory_tolerance=0.25):
+    """
+    Lists the cases which are slower or use more memory than their baselines
+    by more than the tolerances, as fractions of the baselines.
+
+    Small absolute changes, of under 20ms or 2MB, are never regressions, as
+    they are within the noise of a run.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        for metric, tolerance, slack in [
+            ("seconds", time_tolerance, 0.02),
+            ("peak_mb", memory_tolerance, 2.0),
+        ]:
+            limit = max(baseline[metric] * (1 + tolerance), baseline[metric] + slack)
+            if result[metric] > limit:
+                regressions.append(
+                    "{} {}: {:.3f} against a baseline of {:.3f}".format(
+                        key, metric, result[metric], baseline[metric]
+                    )
+                )
+    return regressions
+
+
+def _run_in_subprocess(case, data_dir, n_messages, repeat):
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.suite",
+            "--run-case",
+            case,
+            "--data-dir",
+            data_dir,
+            "--messages",
+            str(n_messages),
+            "--repeat",
+            str(repeat),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--messages",
+        type=int,
+        nargs="+",
+        default=[10000],
+        help="sizes of chat to run, from 10000 up to 50000000",
+    )
+    parser.add_argument(
+        "--cases", nargs="+", default=CASES, choices=CASES, metavar="CASE"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--data-dir", default=None, help="where to keep the chats between runs"
+    )
+    parser.add_argument("--baselines", default=BASELINES)
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--update", action="store_true", help="save the results as the baselines"
+    )
+    parser.add_argument("--run-case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case is not None:
+        result = run_case(args.run_case, args.data_dir, args.messages[0], args.repeat)
+        print(json.dumps(result))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        results = {}
+        for n_messages in args.messages:
+            _write_chats(data_dir, n_messages)
+            for case in args.cases:
+                key = "{}@{}".format(case, n_messages)
+                results[key] = _run_in_subprocess(
+                    case, data_dir, n_messages, args.repeat
+                )
+                print(
+                    "{:<40} {:>9.3f}s {:>9.1f}MB".format(
+                        key, results[key]["seconds"], results[key]["peak_mb"]
+                    )
+                )
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        return 0
+    regressions = compare(
+        results, baselines, args.time_tolerance, args.memory_tolerance
+    )
+    for regression in regressions:
+        print("regression: " + regression, file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
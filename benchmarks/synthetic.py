@@ -0,0 +1,278 @@
+"""
+Deterministic synthetic chats for benchmarking.
+
+Chats are generated a chunk of messages at a time, so that exports of tens of
+millions of messages can be written without holding them in memory, e.g.
+
+    python -m benchmarks.synthetic whatsapp chat.txt --messages 50000000
+
+writes a WhatsApp export of 50 million messages. The same arguments always
+give the same chat.
+"""
+
+import argparse
+import json
+import os
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+import pandas as pd
+
+WORDS = [
+    "cheese",
+    "shop",
+    "parrot",
+    "spam",
+    "eggs",
+    "ni",
+    "shrubbery",
+    "swallow",
+    "coconut",
+    "grail",
+    "the",
+    "and",
+    "a",
+    "is",
+    "it",
+    "not",
+    "dead",
+    "resting",
+    "lumberjack",
+    "okay",
+]
+# messages are generated this many at a time, whatever size of chat is asked
+# for, so that a chat is the same however it is read back
+_CHUNKSIZE = 2**20
+# the mean time between messages when no span is given
+_MEAN_GAP_SECONDS = 60
+
+EXTENSIONS = {"whatsapp": ".txt", "facebook": "", "sms": ".xml", "csv": ".csv"}
+
+
+def _vocabulary(vocabulary, seed):
+    """
+    Returns the words to build messages from, and how likely each one is.
+
+    Words are drawn with Zipf's law, so the first words are the most common.
+    An int gives that many made up words.
+    """
+    if vocabulary is None:
+        vocabulary = WORDS
+    if isinstance(vocabulary, int):
+        rng = np.random.default_rng([seed, vocabulary])
+        letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+        lengths = rng.integers(2, 10, vocabulary)
+        vocabulary = [
+            "".join(rng.choice(letters, n)) + str(i) for i, n in enumerate(lengths)
+        ]
+    weights = 1 / np.arange(1, len(vocabulary) + 1)
+    return np.array(vocabulary, dtype=object), weights / weights.sum()
+
+
+def iter_chat(
+    n_messages,
+    n_people=5,
+    start="2012-01-01",
+    span=None,
+    vocabulary=None,
+    seed=0,
+):
+    """
+    Generates a chat as DataFrames of at most 2**20 messages each.
+
+    Parameters
+    ----------
+    n_messages : int
+        The number of messages in the chat.
+    n_people : int
+        The number of people in the chat, who are called 'Person 0',
+        'Person 1' and so on. Default is 5.
+    start : str
+        The date of the first message. Default is '2012-01-01'.
+    span : str or pd.Timedelta or None
+        Roughly the time from the first message to the last. If None
+        (default), there is a message a minute on average.
+    vocabulary : list of str or int or None
+        The words messages are made of, or the number of words to make up.
+        If None (default), uses `WORDS`.
+    seed : int
+        The seed of the random messages. Default is 0.
+
+    Yields
+    ------
+    pd.DataFrame
+        The messages, with the columns ['date', 'name', 'text'], in order.
+    """
+    if span is None:
+        mean_gap = _MEAN_GAP_SECONDS
+    else:
+        mean_gap = pd.Timedelta(span).total_seconds() / max(n_messages, 1)
+    words, weights = _vocabulary(vocabulary, seed)
+    names = np.array(["Person {}".format(i) for i in range(n_people)], dtype=object)
+    last = np.datetime64(start, "ms")
+    for i, offset in enumerate(range(0, n_messages, _CHUNKSIZE)):
+        n = min(_CHUNKSIZE, n_messages - offset)
+        rng = np.random.default_rng([seed, i])
+        gaps = (rng.exponential(mean_gap * 1000, n) + 1).astype("timedelta64[ms]")
+        dates = last + np.cumsum(gaps)
+        last = dates[-1]
+        lengths = rng.integers(1, 12, n)
+        tokens = words[rng.choice(len(words), lengths.sum(), p=weights)]
+        text = [" ".join(m) for m in np.split(tokens, np.cumsum(lengths)[:-1])]
+        yield pd.DataFrame(
+            {
+                "date": dates.astype("datetime64[ns]"),
+                "name": names[rng.integers(0, n_people, n)],
+                "text": text,
+            }
+        )
+
+
+def generate_chat(n_messages, n_people=5, start="2012-01-01", seed=0, **kwargs):
+    """
+    Generates a chat DataFrame with the columns ['date', 'name', 'text'].
+
+    Takes the same arguments as `iter_chat`, and returns the whole chat.
+    """
+    chunks = list(iter_chat(n_messages, n_people, start, seed=seed, **kwargs))
+    if not chunks:
+        return pd.DataFrame({"date": [], "name": [], "text": []})
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _chunks(chat):
+    return [chat] if isinstance(chat, pd.DataFrame) else chat
+
+
+def write_whatsapp(chat, filename, date_format="%d/%m/%Y, %H:%M"):
+    """
+    Writes a chat DataFrame, or an iterable of them, as a WhatsApp text export.
+    """
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(
+            "01/01/2012, 00:00 - Messages to this chat and calls are now secured "
+            "with end-to-end encryption. Tap for more info.\n"
+        )
+        for df in _chunks(chat):
+            lines = (
+                df["date"].dt.strftime(date_format)
+                + " - "
+                + df["name"]
+                + ": "
+                + df["text"]
+            )
+            f.write("\n".join(lines))
+            f.write("\n")
+
+
+def write_csv(chat, filename):
+    """
+    Writes a chat DataFrame, or an iterable of them, as a CSV file with the
+    columns date, name and text.
+    """
+    with open(filename, "w", encoding="utf-8", newline="") as f:
+        for i, df in enumerate(_chunks(chat)):
+            df[["date", "name", "text"]].to_csv(
+                f, header=i == 0, index=False, date_format="%Y-%m-%d %H:%M:%S"
+            )
+
+
+def write_sms(chat, filename):
+    """
+    Writes a chat DataFrame, or an iterable of them, as an SMS Backup &
+    Restore XML file, with each name as the type of its messages.
+    """
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n")
+        f.write('<smses backup_set="" backup_date="">\n')
+        for df in _chunks(chat):
+            dates = df["date"].to_numpy("datetime64[ms]").view(np.int64)
+            f.writelines(
+                "  <sms date={} type={} body={} />\n".format(
+                    quoteattr(str(date)), quoteattr(name), quoteattr(text)
+                )
+                for date, name, text in zip(dates.tolist(), df["name"], df["text"])
+            )
+        f.write("</smses>\n")
+
+
+def write_facebook(chat, directory, messages_per_file=10000):
+    """
+    Writes a chat DataFrame, or an iterable of them, as a Facebook JSON export
+    of message_1.json, message_2.json and so on in directory.
+
+    Each file lists its messages newest first, as Facebook does.
+    """
+    os.makedirs(directory, exist_ok=True)
+    n_files = 0
+    for df in _chunks(chat):
+        dates = df["date"].to_numpy("datetime64[ms]").view(np.int64).tolist()
+        names, texts = df["name"].tolist(), df["text"].tolist()
+        for offset in range(0, len(df), messages_per_file):
+            rows = range(offset, min(offset + messages_per_file, len(df)))
+            messages = [
+                {
+                    "sender_name": names[i],
+                    "timestamp_ms": dates[i],
+                    "content": texts[i],
+                    "type": "Generic",
+                }
+                for i in reversed(rows)
+            ]
+            n_files += 1
+            path = os.path.join(directory, "message_{}.json".format(n_files))
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "participants": [{"name": n} for n in sorted(set(names))],
+                        "messages": messages,
+                    },
+                    f,
+                )
+
+
+WRITERS = {
+    "whatsapp": write_whatsapp,
+    "facebook": write_facebook,
+    "sms": write_sms,
+    "csv": write_csv,
+}
+
+
+def write_chat(chat_format, path, n_messages, **kwargs):
+    """
+    Generates a chat with `iter_chat` and writes it in chat_format, one of
+    the keys of `WRITERS`, without holding the whole chat in memory.
+    """
+    WRITERS[chat_format](iter_chat(n_messages, **kwargs), path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic chat export.")
+    parser.add_argument("format", choices=sorted(WRITERS))
+    parser.add_argument("path", help="the file to write, or the directory for facebook")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--people", type=int, default=5)
+    parser.add_argument("--start", default="2012-01-01")
+    parser.add_argument(
+        "--span", default=None, help="e.g. '2920D', default a message a minute"
+    )
+    parser.add_argument(
+        "--vocabulary", type=int, default=None, help="number of made up words"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_chat(
+        args.format,
+        args.path,
+        args.messages,
+        n_people=args.people,
+        start=args.start,
+        span=args.span,
+        vocabulary=args.vocabulary,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
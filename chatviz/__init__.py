@@ -1 +1,31 @@
-from .main import visualize_chat
+"""
+Visualizes chats from WhatsApp, Facebook Messenger and SMS.
+
+The plotting functions are imported on first use, so that the loaders in
+`chatviz.load_data` and the statistics in `chatviz.stats` can be used
+without importing matplotlib.
+"""
+
+import importlib
+
+# the public names of the package, and the modules they are imported from
+_LAZY = {
+    "visualize_chat": "chatviz.main",
+    "Dashboard": "chatviz.main",
+    "ChatStats": "chatviz.stats",
+    "Chat": "chatviz.chat",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module 'chatviz' has no attribute {!r}".format(name))
+    value = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,5 @@
+import sys
+
+from chatviz.batch import main
+
+sys.exit(main())
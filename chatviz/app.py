@@ -1,24 +1,168 @@
-from .main import visualize_chat
+"""
+The notebook app, which draws the dashboard of an uploaded chat.
+
+An upload is parsed once, and its aggregates and laid out `Dashboard` are
+kept in memory in a session keyed by a hash of the uploaded bytes. Nothing
+is written to disk unless `visualize` is given a cache_dir, in which case
+the parsed chat is also kept in a `ChatCache` there, so an upload seen
+before, even in an earlier session, is read back rather than parsed again.
+Changing the title, colors, timeline frequency or number of top words of
+the same upload only redraws the panels of the dashboard which they
+change, from the aggregates already computed.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
 import matplotlib.pyplot as plt
-import pandas as pd
-from .load_data import prep_sms_data, prep_whatsapp_data, prep_facebook_data
-import io
-
-
-def visualize(upload_widget, file_type):
-    if upload_widget:
-        file_object = list(upload_widget.value.values())[0]
-        file_name = file_object["metadata"]["name"]
-        byte_stream = io.BytesIO(file_object["content"])
-        if file_type == "Facebook":
-            df = prep_facebook_data(byte_stream)
-        elif file_type == "WhatsApp":
-            df = prep_whatsapp_data(byte_stream)
-        elif file_type == "SMS":
-            df = prep_sms_data(byte_stream)
-        elif file_type == "CSV":
-            df = pd.read_csv(byte_stream)
-        else:
-            raise ValueError(f"Invalid option {file_type}")
-        visualize_chat(df, "Example Plot")
-        plt.show()
+
+from chatviz.cache import ChatCache
+from chatviz.load_data import (
+    prep_csv_data,
+    prep_facebook_data,
+    prep_sms_data,
+    prep_whatsapp_data,
+)
+from chatviz.main import Dashboard
+from chatviz.stats import ChatStats
+
+_LOADERS = {
+    "Facebook": prep_facebook_data,
+    "WhatsApp": prep_whatsapp_data,
+    "SMS": prep_sms_data,
+    "CSV": prep_csv_data,
+}
+# the most uploads kept, as each one holds a whole chat
+_MAX_SESSIONS = 4
+# the panels of the dashboard which each option of visualize changes
+_AFFECTED_PANELS = {
+    "title": ["title"],
+    "colors": ["donuts", "legend", "words", "hours", "days", "reply"],
+    "timeline_freq": ["timeline"],
+    "top_n_words": ["words"],
+}
+
+# the sessions by (hash of the upload, file type), least recently used first
+_sessions = OrderedDict()
+
+
+class _Session:
+    """
+    An uploaded chat, parsed once, with its aggregates and dashboard, and
+    the options it was last drawn with.
+    """
+
+    def __init__(self, content, file_type, cache_dir=None):
+        # the loaders read from a file, so the upload is written to one
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "upload")
+            with open(filename, "wb") as f:
+                f.write(content)
+            loader = _LOADERS[file_type]
+            if cache_dir is None:
+                df = loader(filename)
+            else:
+                df = ChatCache(cache_dir).load(loader, filename)
+        self.stats = ChatStats(df)
+        self.dashboard = Dashboard(len(self.stats.names))
+        # shown with display instead, so pyplot doesn't show it again at the
+        # end of every cell
+        plt.close(self.dashboard.fig)
+        self.options = None
+
+    def draw(self, **options):
+        """
+        Redraws the panels of the dashboard changed by the options since it
+        was last drawn, or all of them the first time.
+        """
+        panels = None
+        if self.options is not None:
+            panels = {
+                panel
+                for option, value in options.items()
+                if value != self.options[option]
+                for panel in _AFFECTED_PANELS[option]
+            }
+        self.dashboard.timeline_freq = options["timeline_freq"]
+        self.dashboard.top_n_words = options["top_n_words"]
+        if panels is None or panels:
+            self.dashboard.draw(
+                self.stats, options["title"], options["colors"], panels=panels
+            )
+        self.options = options
+        return self.dashboard.fig
+
+
+def _get_session(content, file_type, cache_dir=None):
+    """
+    Returns the session of an upload, parsing it if it is new.
+    """
+    if file_type not in _LOADERS:
+        raise ValueError(f"Invalid option {file_type}")
+    key = (hashlib.sha256(content).hexdigest(), file_type)
+    if key in _sessions:
+        _sessions.move_to_end(key)
+    else:
+        _sessions[key] = _Session(content, file_type, cache_dir)
+        if len(_sessions) > _MAX_SESSIONS:
+            _, session = _sessions.popitem(last=False)
+            plt.close(session.dashboard.fig)
+    return _sessions[key]
+
+
+def _show(fig):
+    from IPython.display import display
+
+    display(fig)
+
+
+def visualize(
+    upload_widget,
+    file_type,
+    title="Example Plot",
+    colors="default",
+    timeline_freq="MS",
+    top_n_words=10,
+    cache_dir=None,
+):
+    """
+    Shows the dashboard of the chat uploaded to a widget.
+
+    Meant to be called again by ipywidgets.interact whenever any of its
+    options change. The upload is only parsed the first time it is seen,
+    and after that only the panels changed by the options are redrawn. The
+    dashboard is displayed rather than returned, as interact would display
+    a returned figure a second time.
+
+    Parameters
+    ----------
+    upload_widget : ipywidgets.FileUpload
+        The widget the chat was uploaded to.
+    file_type : {'Facebook', 'WhatsApp', 'SMS', 'CSV'}
+        The format of the chat.
+    title : str
+        The title for the dashboard.
+    colors : {'default'} or list of str or dict
+        The colors to be used for each person in the chat, as for
+        `visualize_chat`.
+    timeline_freq : str
+        The offset string for the bins of the timeline. Default is 'MS'.
+    top_n_words : int
+        The number of top words to show for each person. Default is 10.
+    cache_dir : str or PathLike or None
+        If given, the parsed chat is also kept in a `ChatCache` in this
+        directory, so the same upload isn't parsed again in a later session.
+        The chat stays there after the session ends, until it is evicted or
+        the directory is cleared. If None (default), uploads are only kept
+        in memory.
+    """
+    if not upload_widget:
+        return
+    file_object = list(upload_widget.value.values())[0]
+    session = _get_session(file_object["content"], file_type, cache_dir)
+    fig = session.draw(
+        title=title, colors=colors, timeline_freq=timeline_freq, top_n_words=top_n_words
+    )
+    _show(fig)
@@ -0,0 +1,490 @@
+"""
+Renders the dashboards of many chats at once.
+
+Every chat in a directory of exports is loaded with the loader for its
+format, which is detected from the file, and drawn as the dashboard of
+`visualize_chat` to an image of the same name in the output directory::
+
+    python -m chatviz exports/ dashboards/ --format svg --jobs 8
+
+A chat is either a file, or a directory of Facebook message_*.json files.
+Chats are rendered in a pool of processes with the Agg backend, or the one
+set by the MPLBACKEND environment variable, and a summary of the throughput
+and any failures is written to summary.json in the output directory. Parsed
+chats are kept in a `ChatCache`, so an unchanged export is only parsed once.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from chatviz.load_data import (
+    prep_csv_data,
+    prep_facebook_data,
+    prep_sms_data,
+    prep_whatsapp_data,
+)
+
+_EXTENSIONS = {".json": "facebook", ".txt": "whatsapp", ".xml": "sms", ".csv": "csv"}
+# how much of a file is read to detect its format
+_SNIFF_SIZE = 4096
+# the most dashboards a worker keeps laid out, one per number of people
+_MAX_DASHBOARDS = 8
+
+
+LOADERS = {
+    "facebook": prep_facebook_data,
+    "whatsapp": prep_whatsapp_data,
+    "sms": prep_sms_data,
+    "csv": prep_csv_data,
+}
+# the workers are already a pool of processes, so loaders don't start their own
+_LOADER_OPTIONS = {"facebook": {"n_jobs": 1}}
+# the formats whose loaders can stream a chat in chunks
+_CHUNKED_FORMATS = {"whatsapp", "sms", "csv"}
+
+
+def detect_format(path):
+    """
+    Detects the format of a chat export.
+
+    Directories are Facebook exports split over message_*.json files. Files
+    are detected by their extension, or else by their first few bytes.
+
+    Parameters
+    ----------
+    path : str or PathLike
+        The chat file or directory.
+
+    Returns
+    -------
+    str or None
+        One of the keys of `LOADERS`, or None if the format is unknown.
+    """
+    path = os.fspath(path)
+    if os.path.isdir(path):
+        names = os.listdir(path)
+        if any(n.startswith("message_") and n.endswith(".json") for n in names):
+            return "facebook"
+        return None
+    extension = os.path.splitext(path)[1].lower()
+    if extension in _EXTENSIONS:
+        return _EXTENSIONS[extension]
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_SIZE).lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head.startswith(b"{"):
+        return "facebook"
+    if head.startswith(b"<"):
+        return "sms"
+    first_line = head.split(b"\n", 1)[0].decode("utf-8", "replace")
+    if {"date", "name", "text"} <= set(first_line.strip().split(",")):
+        return "csv"
+    if " - " in first_line:
+        return "whatsapp"
+    return None
+
+
+def _find_chats(directory):
+    """
+    Lists the (path, format) of every chat in directory, by name.
+    """
+    chats = []
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.name.startswith("."):
+            continue
+        chat_format = detect_format(entry.path)
+        if chat_format is not None:
+            chats.append((entry.path, chat_format))
+    return chats
+
+
+def _modified_time(path):
+    if os.path.isdir(path):
+        return max(
+            (e.stat().st_mtime for e in os.scandir(path) if e.is_file()),
+            default=os.stat(path).st_mtime,
+        )
+    return os.stat(path).st_mtime
+
+
+def _chat_name(path):
+    return os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+
+
+def _output_names(paths):
+    """
+    Names the image of each chat after it, keeping the extension of the
+    chats whose names would otherwise be the same, e.g. family.txt and
+    family.csv.
+    """
+    counts = Counter(_chat_name(path) for path in paths)
+    return [
+        (
+            _chat_name(path)
+            if counts[_chat_name(path)] == 1
+            else os.path.basename(os.path.normpath(path))
+        )
+        for path in paths
+    ]
+
+
+def _save_figure(fig, output):
+    """
+    Saves fig to output through a temporary file of its own in the same
+    directory, so that a chat which fails part way through never leaves an
+    output that looks up to date, and workers never share a partial file.
+    """
+    directory, name = os.path.split(output)
+    fd, partial = tempfile.mkstemp(suffix=".partial", prefix=name + ".", dir=directory)
+    os.close(fd)
+    try:
+        fig.savefig(partial, format=os.path.splitext(output)[1][1:])
+        # mkstemp makes the file private, unlike the images saved before
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(partial, 0o666 & ~umask)
+        os.replace(partial, output)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def _on_alarm(signum, frame):
+    raise TimeoutError("timed out")
+
+
+def _init_worker():
+    # headless by default, unless a backend was picked with MPLBACKEND
+    import matplotlib
+
+    matplotlib.use(os.environ.get("MPLBACKEND", "Agg"))
+
+
+# the dashboards laid out by this process, by number of people, and the
+# figsize and options they were laid out with
+_dashboards = {}
+_dashboard_options = None
+
+
+def _get_dashboard(n_people, figsize, options):
+    """
+    Returns a Dashboard for n_people, reusing the last one laid out with the
+    same figsize and options.
+    """
+    import matplotlib.pyplot as plt
+
+    from chatviz.main import Dashboard
+
+    global _dashboard_options
+    if _dashboard_options != (figsize, options):
+        for dashboard in _dashboards.values():
+            plt.close(dashboard.fig)
+        _dashboards.clear()
+        _dashboard_options = (figsize, options)
+    if n_people not in _dashboards:
+        if len(_dashboards) >= _MAX_DASHBOARDS:
+            plt.close(_dashboards.pop(next(iter(_dashboards))).fig)
+        with plt.rc_context({"figure.figsize": figsize}):
+            _dashboards[n_people] = Dashboard(n_people, **options)
+    return _dashboards[n_people]
+
+
+def _counted(chunks, result):
+    for df in chunks:
+        result["messages"] += len(df)
+        yield df
+
+
+def _render_chat(
+    path, chat_format, output, timeout, figsize, options, chunksize, cache
+):
+    """
+    Loads and renders one chat, returning how it went.
+    """
+    from chatviz.cache import ChatCache
+    from chatviz.stats import ChatStats
+
+    start = time.perf_counter()
+    result = {"chat": path, "format": chat_format, "messages": 0, "error": None}
+    use_alarm = timeout is not None and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        options = dict(options)
+        colors = options.pop("colors", "default")
+        n_jobs = options.pop("n_jobs", 1)
+        # exports are big and rarely change, so they are keyed by path and
+        # modification time rather than read in full to hash them
+        chat_cache = ChatCache(
+            directory=None if cache is True else cache,
+            enabled=None if cache is not False else False,
+            hash_contents=False,
+        )
+        loader = LOADERS[chat_format]
+        if chunksize is not None and chat_format in _CHUNKED_FORMATS:
+            chunks = chat_cache.load(loader, path, chunksize=chunksize)
+            stats = ChatStats.from_chunks(_counted(chunks, result))
+        else:
+            loader_options = _LOADER_OPTIONS.get(chat_format, {})
+            df = chat_cache.load(loader, path, **loader_options)
+            result["messages"] = len(df)
+            stats = ChatStats(df, n_jobs=n_jobs)
+        # the figure is laid out once per number of people, and only its
+        # data is updated for each chat
+        dashboard = _get_dashboard(len(stats.names), figsize, options)
+        fig = dashboard.draw(stats, _chat_name(path), colors=colors)
+        _save_figure(fig, output)
+    except Exception as e:
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _failure(job, error):
+    path, chat_format, _ = job
+    return {
+        "chat": path,
+        "format": chat_format,
+        "messages": 0,
+        "error": "{}: {}".format(type(error).__name__, error),
+        "seconds": None,
+    }
+
+
+def _submit(executor, job, args):
+    path, chat_format, output = job
+    return executor.submit(_render_chat, path, chat_format, output, *args)
+
+
+def _render_jobs(jobs, n_jobs, args):
+    """
+    Renders the jobs in a pool of n_jobs processes, returning their results
+    in order.
+
+    A worker which dies, e.g. killed for running out of memory, breaks the
+    whole pool, so the chats without a result are rendered again in a new
+    one. If that breaks too, they are rendered one at a time, and only the
+    chat whose worker died is counted as a failure.
+    """
+    results = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    for _ in range(2):
+        if not pending:
+            break
+        with ProcessPoolExecutor(
+            min(n_jobs, len(pending)), initializer=_init_worker
+        ) as executor:
+            futures = {_submit(executor, jobs[i], args): i for i in pending}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except BrokenProcessPool:
+                    pass
+                except Exception as e:
+                    results[i] = _failure(jobs[i], e)
+        pending = [i for i in pending if results[i] is None]
+    executor = None
+    try:
+        for i in pending:
+            if executor is None:
+                executor = ProcessPoolExecutor(1, initializer=_init_worker)
+            try:
+                results[i] = _submit(executor, jobs[i], args).result()
+            except BrokenProcessPool as e:
+                results[i] = _failure(jobs[i], e)
+                executor.shutdown()
+                executor = None
+            except Exception as e:
+                results[i] = _failure(jobs[i], e)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+
+def render_chats(
+    input_dir,
+    output_dir,
+    image_format="png",
+    n_jobs=None,
+    timeout=None,
+    force=False,
+    figsize=(30, 40),
+    chunksize=None,
+    cache=True,
+    **kwargs,
+):
+    """
+    Renders the dashboard of every chat in a directory.
+
+    Parameters
+    ----------
+    input_dir : str or PathLike
+        The directory of chat exports. Every file or Facebook thread
+        directory in it with a detectable format is rendered.
+    output_dir : str or PathLike
+        Where to write the images, which are named after the chats, with
+        their extension too if two chats would otherwise share a name. It is
+        created if needed.
+    image_format : {'png', 'svg'} or str
+        The image format, which can be any format matplotlib can save to.
+        Default is 'png'.
+    n_jobs : int or None
+        The number of processes to render with. If None (default), uses one
+        per CPU.
+    timeout : float or None
+        The most seconds to spend on one chat, after which it is counted as a
+        failure. If None (default), there is no limit. Only supported where
+        signal.SIGALRM is, so not on Windows.
+    force : bool
+        If False (default), chats whose image is newer than the export are
+        skipped. If True, every chat is rendered.
+    figsize : (float, float)
+        The size of each figure in inches.
+    chunksize : int or None
+        If given, WhatsApp, SMS and CSV chats are read and aggregated this many
+        messages at a time with `ChatStats.from_chunks`, so that chats too
+        big for the memory of a worker can still be rendered. Facebook chats
+        are always loaded whole. If None (default), every chat is loaded
+        whole.
+    cache : bool or str or PathLike
+        If True (default), parsed chats are kept in a `ChatCache` in its
+        default directory, keyed by the path and modification time of each
+        export, so that rendering an unchanged chat again, e.g. with other
+        options, doesn't parse it again. The cache can also be turned off
+        with the CHATVIZ_CACHE environment variable. A directory keeps the
+        cache there instead, and False turns it off.
+    **kwargs
+        The options of `visualize_chat`. Each worker lays out a `Dashboard`
+        once for every number of people, and redraws it for each chat.
+
+    Returns
+    -------
+    dict
+        The summary which is also written to summary.json in output_dir,
+        with the number of chats rendered and skipped, the failures and the
+        throughput.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    skipped = []
+    chats = _find_chats(input_dir)
+    names = _output_names([path for path, _ in chats])
+    for (path, chat_format), name in zip(chats, names):
+        output = os.path.join(output_dir, name + "." + image_format)
+        if (
+            not force
+            and os.path.exists(output)
+            and os.stat(output).st_mtime >= _modified_time(path)
+        ):
+            skipped.append(path)
+        else:
+            jobs.append((path, chat_format, output))
+    results = []
+    if jobs:
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(jobs))
+        args = (timeout, figsize, kwargs, chunksize, cache)
+        results = _render_jobs(jobs, n_jobs, args)
+    elapsed = time.perf_counter() - start
+    rendered = [r for r in results if r["error"] is None]
+    messages = sum(r["messages"] for r in rendered)
+    summary = {
+        "rendered": len(rendered),
+        "skipped": len(skipped),
+        "failed": [
+            {"chat": r["chat"], "format": r["format"], "error": r["error"]}
+            for r in results
+            if r["error"] is not None
+        ],
+        "messages": messages,
+        "seconds": elapsed,
+        "chats_per_second": len(rendered) / elapsed if elapsed else 0.0,
+        "messages_per_second": messages / elapsed if elapsed else 0.0,
+        "chats": results,
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m chatviz",
+        description="Renders a dashboard for every chat export in a directory.",
+    )
+    parser.add_argument("input_dir", help="the directory of chat exports")
+    parser.add_argument("output_dir", help="where to write the images")
+    parser.add_argument("--format", default="png", help="png (default) or svg")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="processes to use, default one per CPU"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None, help="most seconds to spend per chat"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="render chats which are up to date too"
+    )
+    parser.add_argument(
+        "--size",
+        type=float,
+        nargs=2,
+        default=(30, 40),
+        metavar=("WIDTH", "HEIGHT"),
+        help="figure size in inches, default 30 40",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="stream WhatsApp, SMS and CSV chats this many messages at a time",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every chat again rather than reading it from the cache",
+    )
+    parser.add_argument(
+        "--keep-stopwords",
+        action="store_true",
+        help="don't remove chatviz.utils.STOPWORDS from the top words",
+    )
+    args = parser.parse_args(argv)
+
+    from chatviz.utils import STOPWORDS
+
+    summary = render_chats(
+        args.input_dir,
+        args.output_dir,
+        image_format=args.format,
+        n_jobs=args.jobs,
+        timeout=args.timeout,
+        force=args.force,
+        figsize=tuple(args.size),
+        chunksize=args.chunksize,
+        cache=not args.no_cache,
+        stopwords=None if args.keep_stopwords else STOPWORDS,
+        timeline_color="C0",
+    )
+    print(
+        "rendered {rendered}, skipped {skipped}, failed {n_failed} in "
+        "{seconds:.1f}s ({chats_per_second:.2f} chats/s, "
+        "{messages_per_second:,.0f} messages/s)".format(
+            n_failed=len(summary["failed"]), **summary
+        )
+    )
+    for failure in summary["failed"]:
+        print("failed {chat}: {error}".format(**failure), file=sys.stderr)
+    return 1 if summary["failed"] else 0
@@ -0,0 +1,439 @@
+"""
+An on-disk cache of parsed chats.
+
+Parsing a large export is far slower than reading back the DataFrame it
+produces, so `ChatCache` stores the output of the `prep_*_data` loaders as
+columnar NumPy arrays, keyed by a hash of the input file, or of its path and
+modification time, the loader and `chatviz.load_data.LOADER_VERSION`. Repeat
+loads of the same file are then read straight from the memory-mapped arrays
+without any parsing. Chats can also be written and read a chunk at a time, for
+chats too big for memory.
+"""
+
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from chatviz.load_data import LOADER_VERSION, _TEXT_DTYPE, normalize_chat_data
+
+_HASH_BLOCKSIZE = 2**20
+# the arrays a chat is stored as
+_DTYPES = {
+    "date": np.int64,
+    "name_codes": np.int32,
+    "text_offsets": np.int64,
+    "text_data": np.uint8,
+    "text_missing": np.bool_,
+}
+
+
+def _default_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.environ.get("CHATVIZ_CACHE_DIR", os.path.join(cache_home, "chatviz"))
+
+
+def _default_enabled():
+    return os.environ.get("CHATVIZ_CACHE", "1").lower() not in ("0", "false", "off")
+
+
+def _input_files(filename):
+    """
+    Lists the files a loader would read for filename, which can also be a
+    directory or a glob pattern.
+    """
+    path = os.fspath(filename)
+    if os.path.isdir(path):
+        files = [
+            os.path.join(root, f) for root, _, names in os.walk(path) for f in names
+        ]
+    elif any(c in path for c in "*?["):
+        files = glob.glob(path)
+    else:
+        files = [path]
+    return sorted(files)
+
+
+def _entry_size(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+class ChatCache:
+    """
+    A cache of parsed chats, stored on disk as memory-mapped NumPy arrays.
+
+    Parameters
+    ----------
+    directory : str or PathLike or None
+        Where the cache is stored. If None (default), uses the
+        CHATVIZ_CACHE_DIR environment variable, falling back to
+        ~/.cache/chatviz.
+    max_bytes : int or None
+        The cache is trimmed to at most this many bytes, by evicting the
+        least recently used chats first. Default is 1 GiB. If None, there is
+        no size limit.
+    max_age : float or None
+        Chats which have not been used for this many seconds are evicted.
+        If None (default), chats never expire.
+    enabled : bool or None
+        If False, every load calls the loader directly and nothing is read
+        from or written to disk. If None (default), the cache is enabled
+        unless the CHATVIZ_CACHE environment variable is set to 0.
+    hash_contents : bool
+        If True (default), chats are keyed by the contents of their files,
+        so copies of a file share one cached chat. If False, they are keyed
+        by the paths, sizes and modification times of their files instead,
+        which saves reading big files in full on every load.
+
+    Examples
+    --------
+    >>> from chatviz.load_data import prep_whatsapp_data
+    >>> cache = ChatCache(enabled=False)
+    >>> df = cache.load(prep_whatsapp_data, "tests/test_data/wa_data.txt")
+    >>> list(df.columns)
+    ['date', 'name', 'text']
+    """
+
+    def __init__(
+        self,
+        directory=None,
+        max_bytes=2**30,
+        max_age=None,
+        enabled=None,
+        hash_contents=True,
+    ):
+        self.directory = directory if directory is not None else _default_directory()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled if enabled is not None else _default_enabled()
+        self.hash_contents = hash_contents
+
+    def key(self, loader, filename, **kwargs):
+        """
+        Returns the cache key for loading filename with loader.
+
+        The key is a hash of the contents and names of the input files, or
+        of their paths, sizes and modification times if not hash_contents,
+        the loader and its keyword arguments, and the loader version.
+        """
+        h = hashlib.sha256()
+        header = [
+            loader.__module__,
+            loader.__qualname__,
+            LOADER_VERSION,
+            sorted(kwargs.items()),
+        ]
+        h.update(repr(header).encode())
+        for path in _input_files(filename):
+            if not self.hash_contents:
+                stat = os.stat(path)
+                path = os.path.abspath(path)
+                h.update(repr((path, stat.st_size, stat.st_mtime_ns)).encode())
+                continue
+            h.update(os.path.basename(path).encode() + b"\0")
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(_HASH_BLOCKSIZE), b""):
+                    h.update(block)
+        return h.hexdigest()
+
+    def load(self, loader, filename, chunksize=None, **kwargs):
+        """
+        Loads filename with loader, reading from the cache when possible.
+
+        Parameters
+        ----------
+        loader : callable
+            One of the `prep_*_data` functions from `chatviz.load_data`, or
+            any function with the same signature.
+        filename : str or PathLike
+            The file to load, which is passed on to the loader.
+        chunksize : int or None
+            If None (default), the whole chat is returned as one DataFrame.
+            If an int, an iterator of DataFrames with at most `chunksize`
+            messages each is returned instead, read from the cache a chunk at
+            a time, or else from the loader with the same chunksize while the
+            chunks are written to the cache. The loader must take a
+            chunksize. Chunked and whole loads share the same cached chat.
+        **kwargs
+            Passed on to the loader, and part of the cache key.
+
+        Returns
+        -------
+        pd.DataFrame or iterator of pd.DataFrame
+            The chat, with the columns ['date', 'name', 'text'], or an
+            iterator of such DataFrames if `chunksize` is given.
+        """
+        if not self.enabled:
+            if chunksize is not None:
+                kwargs["chunksize"] = chunksize
+            return loader(filename, **kwargs)
+        path = os.path.join(self.directory, self.key(loader, filename, **kwargs))
+        if chunksize is not None:
+            if chunksize < 1:
+                raise ValueError(f"chunksize must be a positive int, got {chunksize}")
+            return self._load_chunks(loader, filename, path, chunksize, kwargs)
+        if os.path.isdir(path):
+            os.utime(path)
+            return self._read(path)
+        df = loader(filename, **kwargs)
+        self._write(df, path)
+        self.evict()
+        return df
+
+    def _load_chunks(self, loader, filename, path, chunksize, kwargs):
+        if os.path.isdir(path):
+            os.utime(path)
+            yield from _read_chunks(path, chunksize)
+            return
+        writer = _ChunkWriter(path)
+        try:
+            for df in loader(filename, chunksize=chunksize, **kwargs):
+                writer.write(df)
+                yield df
+            writer.commit()
+        finally:
+            # nothing is cached if the chunks weren't all read
+            writer.discard()
+        self.evict()
+
+    def evict(self):
+        """
+        Removes expired chats, then the least recently used ones until the
+        cache fits in max_bytes.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        entries = sorted(
+            (e.stat().st_mtime, e.path, _entry_size(e.path))
+            for e in os.scandir(self.directory)
+            if e.is_dir() and not e.name.startswith(".")
+        )
+        total = sum(size for _, _, size in entries)
+        now = time.time()
+        for mtime, path, size in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not (expired or too_big):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Removes every chat from the cache.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @staticmethod
+    def _write(df, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".", dir=os.path.dirname(path))
+        try:
+            arrays, names = _arrays(df)
+            for column, values in arrays.items():
+                np.save(os.path.join(tmp, column + ".npy"), values)
+            _commit(tmp, path, names)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @staticmethod
+    def _read(path):
+        def read(column):
+            return np.load(os.path.join(path, column + ".npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "names.json")) as f:
+            names = json.load(f)
+        text = _read_text(
+            read("text_offsets"), read("text_data"), np.array(read("text_missing"))
+        )
+        df = pd.DataFrame(
+            {
+                "date": np.array(read("date")).view("datetime64[ns]"),
+                "name": pd.Categorical.from_codes(read("name_codes"), names),
+                "text": text,
+            }
+        )
+        return normalize_chat_data(df)
+
+
+def _arrays(df):
+    """
+    Returns the arrays a chat is stored as, by column, and the names the
+    codes in 'name_codes' are of.
+    """
+    names = pd.Categorical(df["name"])
+    text = df["text"]
+    missing = text.isnull().to_numpy()
+    encoded = [
+        str(t).encode("utf-8", "surrogatepass") if not m else b""
+        for t, m in zip(text, missing)
+    ]
+    offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    arrays = {
+        "date": df["date"].to_numpy("datetime64[ns]").view(np.int64),
+        "name_codes": names.codes.astype(np.int32),
+        "text_offsets": offsets,
+        "text_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "text_missing": missing,
+    }
+    return arrays, names.categories.tolist()
+
+
+def _commit(tmp, path, names):
+    """
+    Moves the arrays written to tmp into the cache at path.
+    """
+    with open(os.path.join(tmp, "names.json"), "w") as f:
+        json.dump(names, f)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # another process cached the same chat first
+        if not os.path.isdir(path):
+            raise
+
+
+class _ChunkWriter:
+    """
+    Writes a chat to the cache a chunk at a time, as the same arrays as
+    `ChatCache._write`, so that chats too big for memory can be cached.
+
+    Each array is appended to a raw file as the chunks come in, and only
+    given its .npy header once its length is known, in `commit`.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.tmp = tempfile.mkdtemp(prefix=".", dir=os.path.dirname(path))
+        self.files = {
+            column: open(os.path.join(self.tmp, column + ".bin"), "wb")
+            for column in _DTYPES
+        }
+        self.files["text_offsets"].write(np.zeros(1, dtype=np.int64).tobytes())
+        # the code of every name seen so far, across the chunks
+        self.names = {}
+        self.n_bytes = 0
+
+    def write(self, df):
+        arrays, names = _arrays(df)
+        codes = [self.names.setdefault(name, len(self.names)) for name in names]
+        # missing names keep the code -1
+        arrays["name_codes"] = np.array(codes + [-1], np.int32)[arrays["name_codes"]]
+        arrays["text_offsets"] = arrays["text_offsets"][1:] + self.n_bytes
+        self.n_bytes += len(arrays["text_data"])
+        for column, values in arrays.items():
+            self.files[column].write(values.astype(_DTYPES[column]).tobytes())
+
+    def commit(self):
+        for column, f in self.files.items():
+            f.close()
+            raw = os.path.join(self.tmp, column + ".bin")
+            dtype = np.dtype(_DTYPES[column])
+            header = {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (os.path.getsize(raw) // dtype.itemsize,),
+            }
+            with open(raw, "rb") as src:
+                with open(os.path.join(self.tmp, column + ".npy"), "wb") as dst:
+                    np.lib.format.write_array_header_1_0(dst, header)
+                    shutil.copyfileobj(src, dst)
+            os.remove(raw)
+        _commit(self.tmp, self.path, list(self.names))
+
+    def discard(self):
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def _read_chunks(path, chunksize):
+    """
+    Yields a cached chat as DataFrames of at most chunksize messages.
+
+    Only the rows of each chunk are read from disk, rather than mapping the
+    arrays into memory, so the memory used doesn't grow as the chat is read.
+    """
+    with open(os.path.join(path, "names.json")) as f:
+        names = json.load(f)
+    with contextlib.ExitStack() as stack:
+        arrays = {}
+        for column in _DTYPES:
+            f = stack.enter_context(open(os.path.join(path, column + ".npy"), "rb"))
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[column] = (f, f.tell(), dtype)
+            if column == "date":
+                n_rows = shape[0]
+
+        def read(column, start, stop):
+            f, offset, dtype = arrays[column]
+            f.seek(offset + start * dtype.itemsize)
+            return np.fromfile(f, dtype=dtype, count=stop - start)
+
+        for start in range(0, n_rows, chunksize):
+            stop = min(start + chunksize, n_rows)
+            offsets = read("text_offsets", start, stop + 1)
+            text = _read_text(
+                offsets - offsets[0],
+                read("text_data", offsets[0], offsets[-1]),
+                read("text_missing", start, stop),
+            )
+            df = pd.DataFrame(
+                {
+                    "date": read("date", start, stop).view("datetime64[ns]"),
+                    "name": pd.Categorical.from_codes(
+                        read("name_codes", start, stop), names
+                    ),
+                    "text": text,
+                }
+            )
+            yield normalize_chat_data(df)
+
+
+def _read_text(offsets, data, missing):
+    """
+    Builds the text column from its UTF-8 buffer and offsets.
+
+    With pyarrow the buffer is wrapped as an Arrow string array without
+    copying it, otherwise each message is decoded into a Python string.
+    """
+    if _TEXT_DTYPE is not object and offsets[-1] < 2**31:
+        import pyarrow as pa
+
+        array = pa.StringArray.from_buffers(
+            len(missing),
+            pa.py_buffer(offsets.astype(np.int32)),
+            pa.py_buffer(data),
+            pa.py_buffer(np.packbits(~missing, bitorder="little")),
+            null_count=int(missing.sum()),
+        )
+        try:
+            array.validate(full=True)
+        except pa.ArrowInvalid:
+            # lone surrogates are not valid UTF-8, so decode them below
+            pass
+        else:
+            return pd.arrays.ArrowStringArray(array)
+    offsets = offsets.tolist()
+    data = data.tobytes()
+    text = np.array(
+        [
+            data[start:end].decode("utf-8", "surrogatepass")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ],
+        dtype=object,
+    )
+    text[missing] = None
+    return text
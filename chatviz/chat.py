@@ -0,0 +1,535 @@
+"""
+Fast queries of a chat by time and by person.
+"""
+
+import functools
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from chatviz.load_data import normalize_chat_data
+from chatviz.stats import (
+    _MERGEABLE,
+    ChatStats,
+    _aggregate,
+    _count_words,
+    _merge_aggregates,
+    _rolls_up_from_hours,
+    _time_bin_bounds,
+)
+
+# the aggregates of windows are merged from those of blocks of this many
+# messages, which are kept for any later window which covers them too
+_BLOCK_SIZE = 2**16
+# the most windows whose ChatStats are kept
+_MAX_WINDOWS = 64
+# the most blocks whose aggregates are kept, least recently used first out
+_MAX_BLOCKS = 64
+_HOUR = pd.Timedelta(hours=1).value
+# the sums of each message, in the order of the columns of the running totals
+_ROWS, _MESSAGES, _WORDS, _CHARS = range(4)
+
+
+def _message_sums(df):
+    """
+    Returns an int64 array of one row per message, of 1, whether it has text
+    and its number of words and characters, as ChatStats counts them.
+    """
+    text = df["text"]
+    return np.column_stack(
+        [
+            np.ones(len(df), dtype=np.int64),
+            text.notnull().to_numpy(np.int64),
+            _count_words(text),
+            text.str.len().fillna(0).to_numpy(np.int64),
+        ]
+    )
+
+
+def _weekly_hour(hours):
+    """
+    Returns the hour of the week, from 0 at midnight on Monday, of hours
+    since the epoch, which was on a Thursday.
+    """
+    return (hours // 24 + 3) % 7 * 24 + hours % 24
+
+
+def _add_sums(sums, keys, values):
+    """
+    Adds each row of values to the sums of an array of (bins, people, sums)
+    at the flat (bin, person) of its key, in place.
+    """
+    n_cells = sums.shape[0] * sums.shape[1]
+    for column in range(values.shape[1]):
+        counts = np.bincount(keys, weights=values[:, column], minlength=n_cells)
+        sums[..., column] += counts.astype(np.int64).reshape(sums.shape[:2])
+
+
+class _PrefixSums:
+    """
+    Running totals of the messages, words and characters of each person,
+    hour by hour, so that the totals over any whole hours are the difference
+    of two rows.
+
+    Only the hours in which someone sent a message are kept. Alongside, the
+    number of messages of each person is kept as a running total for each
+    hour of the week, over the hours ordered by hour of the week first, so
+    that the hour and weekday counts of a window are two rows per hour of
+    the week.
+    """
+
+    def __init__(self, df, dates, codes, n_people):
+        hours = dates // _HOUR
+        new_hour = np.diff(hours, prepend=hours[:1] - 1) != 0
+        self.hours = hours[new_hour]
+        bins = np.cumsum(new_hour) - 1
+        sums = np.zeros((len(self.hours) + 1, n_people, 4), dtype=np.int64)
+        for start in range(0, len(df), _BLOCK_SIZE):
+            block = slice(start, start + _BLOCK_SIZE)
+            # the hours of a block are consecutive, so it is counted into
+            # just the rows of those hours
+            first = bins[block][0]
+            n_rows = bins[block][-1] - first + 1
+            named = codes[block] != -1
+            keys = (bins[block] - first)[named] * n_people + codes[block][named]
+            values = _message_sums(df.iloc[block])[named]
+            _add_sums(sums[first + 1 : first + n_rows + 1], keys, values)
+        weekly = _weekly_hour(self.hours)
+        order = np.argsort(weekly, kind="stable")
+        # sorted by hour of the week then by hour, as one key
+        self.weekly_keys = weekly[order] * len(self.hours) + order
+        self.weekly_sums = np.zeros((len(self.hours) + 1, n_people), dtype=np.int64)
+        np.cumsum(sums[1:, :, _MESSAGES][order], axis=0, out=self.weekly_sums[1:])
+        self.sums = np.cumsum(sums, axis=0, out=sums)
+
+    def _rows(self, hours):
+        return np.searchsorted(self.hours, hours)
+
+    def totals(self, start, stop, bounds=()):
+        """
+        Returns the sums of each person in the hours from start up to stop,
+        split at the hours in bounds, as an array of (bins, people, sums).
+        """
+        hours = np.clip(np.concatenate([[start], bounds, [stop]]), start, stop)
+        sums = self.sums[self._rows(hours)]
+        return sums[1:] - sums[:-1]
+
+    def weekly(self, start, stop):
+        """
+        Returns the messages of each person in the hours from start up to
+        stop in each hour of the week, as an array of (hours, people).
+        """
+        lo, hi = self._rows([start, stop])
+        keys = np.arange(7 * 24) * len(self.hours)
+        sums = self.weekly_sums
+        return (
+            sums[np.searchsorted(self.weekly_keys, keys + hi)]
+            - sums[np.searchsorted(self.weekly_keys, keys + lo)]
+        )
+
+
+class _ChatIndex:
+    """
+    The sorted messages of a chat and the indexes into them, shared by every
+    window of the chat.
+    """
+
+    def __init__(self, df, max_words):
+        df = df[df["date"].notnull()]
+        if not isinstance(df["name"].dtype, pd.CategoricalDtype):
+            df = normalize_chat_data(df)
+        if not df["date"].is_monotonic_increasing:
+            df = df.sort_values("date", kind="mergesort")
+        self.df = df.reset_index(drop=True)
+        self.max_words = max_words
+        self.dates = self.df["date"].to_numpy("datetime64[ns]").view(np.int64)
+        names = self.df["name"].cat
+        self.names = names.categories.astype(object)
+        codes = names.codes.to_numpy()
+        # the positions of the messages of each person, in time order
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(self.names) + 1))
+        self.positions = [
+            order[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        self.blocks = OrderedDict()
+        self.windows = OrderedDict()
+        self._prefix_sums = None
+
+    @property
+    def prefix_sums(self):
+        """
+        _PrefixSums : The running totals of the chat, summed the first time
+        they are needed.
+        """
+        if self._prefix_sums is None:
+            self._prefix_sums = _PrefixSums(
+                self.df,
+                self.dates,
+                self.df["name"].cat.codes.to_numpy(),
+                len(self.names),
+            )
+        return self._prefix_sums
+
+
+class Chat:
+    """
+    A chat which can be narrowed down to a window of time and some of the
+    people in it.
+
+    The messages are sorted by date once, and the positions of each
+    person's messages are kept, so `between` and `by` are binary searches
+    into those rather than scans of the messages. Each returns a new Chat,
+    which shares the messages and indexes of the one it came from. A Chat
+    can be passed to any of the plots in place of a DataFrame.
+
+    The messages, words and characters of each person are summed hour by
+    hour into running totals the first time any window's stats are needed.
+    The counts of a window, its hour and weekday counts, and its timelines
+    with bins of whole hours, are then the differences of the totals at
+    either end of it, plus the few messages in any hours it only partly
+    covers, so moving the window costs the same however many messages it
+    has. The other aggregates of a window are merged from those of fixed
+    blocks of messages, and those of the last 64 blocks used are kept, so
+    that the aggregates of any other window which overlaps them are not
+    computed again.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe of messages. Must have the columns
+        ['date', 'name', 'text']. It is sorted by date if it is not already.
+    max_words : int or None
+        Passed on to `ChatStats`.
+
+    Examples
+    --------
+    >>> from chatviz.utils import load_example_chat_data
+    >>> chat = Chat(load_example_chat_data())
+    >>> october = chat.between("1970-10-01", "1970-11-01")
+    >>> len(october)
+    775
+    >>> october.by("John Cleese").stats.message_counts.tolist()
+    [282]
+    """
+
+    def __init__(self, df, max_words=None):
+        self._index = _ChatIndex(df, max_words)
+        self._start = 0
+        self._stop = len(self._index.df)
+        self._codes = None
+
+    def _view(self, start, stop, codes):
+        chat = Chat.__new__(Chat)
+        chat._index = self._index
+        chat._start = start
+        chat._stop = stop
+        chat._codes = codes
+        return chat
+
+    def between(self, start=None, end=None):
+        """
+        Narrows the chat down to the messages sent from start up to, but not
+        including, end.
+
+        Parameters
+        ----------
+        start : str or datetime-like or None
+            The earliest date. If None (default), the window is left as is.
+        end : str or datetime-like or None
+            The date after the last. If None (default), the window is left as
+            is.
+
+        Returns
+        -------
+        Chat
+            The messages of this chat in the window.
+        """
+        dates = self._index.dates
+        lo, hi = self._start, self._stop
+        if start is not None:
+            lo = max(lo, np.searchsorted(dates, pd.Timestamp(start).value, "left"))
+        if end is not None:
+            hi = min(hi, np.searchsorted(dates, pd.Timestamp(end).value, "left"))
+        return self._view(lo, max(lo, hi), self._codes)
+
+    def by(self, names):
+        """
+        Narrows the chat down to the messages sent by some people.
+
+        Parameters
+        ----------
+        names : str or iterable of str
+            The person or people whose messages are kept.
+
+        Returns
+        -------
+        Chat
+            The messages of this chat sent by those people.
+        """
+        if isinstance(names, str):
+            names = [names]
+        codes = self._index.names.get_indexer(list(names))
+        codes = frozenset(int(c) for c in codes if c != -1)
+        if self._codes is not None:
+            codes &= self._codes
+        return self._view(self._start, self._stop, codes)
+
+    @property
+    def names(self):
+        """
+        list of str : The sorted names of the people the chat is narrowed down
+        to, whether or not they sent any messages in its window.
+        """
+        codes = range(len(self._index.names)) if self._codes is None else self._codes
+        return sorted(self._index.names[c] for c in codes)
+
+    def _positions(self, start, stop):
+        """
+        Returns the positions of the messages between start and stop sent by
+        the people of the chat, or None if that is all of them.
+        """
+        if self._codes is None:
+            return None
+        slices = []
+        for code in sorted(self._codes):
+            positions = self._index.positions[code]
+            lo, hi = np.searchsorted(positions, [start, stop])
+            slices.append(positions[lo:hi])
+        if len(slices) == 1:
+            return slices[0]
+        return np.sort(np.concatenate(slices + [np.array([], dtype=np.intp)]))
+
+    def _rows(self, start, stop):
+        positions = self._positions(start, stop)
+        if positions is None:
+            return self._index.df.iloc[start:stop]
+        return self._index.df.iloc[positions]
+
+    def __len__(self):
+        if self._codes is None:
+            return self._stop - self._start
+        return len(self._positions(self._start, self._stop))
+
+    @property
+    def frame(self):
+        """
+        pd.DataFrame : The messages of the chat, with the columns
+        ['date', 'name', 'text']. A view of the messages, rather than a copy,
+        unless the chat has been narrowed down to some people.
+        """
+        return self._rows(self._start, self._stop)
+
+    def _ends(self):
+        """
+        Returns the int64 ns dates of the first and last messages of the
+        people of the chat in its window, or None if there are none.
+        """
+        codes = range(len(self._index.names)) if self._codes is None else self._codes
+        ends = []
+        for code in codes:
+            positions = self._index.positions[code]
+            lo, hi = np.searchsorted(positions, [self._start, self._stop])
+            if lo < hi:
+                ends += [positions[lo], positions[hi - 1]]
+        if not ends:
+            return None
+        return self._index.dates[min(ends)], self._index.dates[max(ends)]
+
+    def _split_hours(self):
+        """
+        Splits the window into the whole hours it covers, from start up to
+        stop, and the messages in the hours at either end of it which it
+        only covers part of.
+        """
+        dates = self._index.dates
+        lo, hi = self._start, self._stop
+        if lo == hi:
+            return 0, 0, self._rows(lo, hi)
+        start = dates[lo] // _HOUR
+        if lo > 0 and dates[lo - 1] // _HOUR == start:
+            start += 1
+        stop = dates[hi - 1] // _HOUR + 1
+        if hi < len(dates) and dates[hi] // _HOUR == stop - 1:
+            stop -= 1
+        if start >= stop:
+            return start, start, self._rows(lo, hi)
+        head = np.searchsorted(dates, start * _HOUR)
+        tail = np.searchsorted(dates, stop * _HOUR)
+        if self._codes is None:
+            positions = np.r_[lo:head, tail:hi]
+        else:
+            positions = np.concatenate(
+                [self._positions(lo, head), self._positions(tail, hi)]
+            )
+        return start, stop, self._index.df.iloc[positions]
+
+    def _sums(self, bounds=()):
+        """
+        Sums the messages of everyone in the window, from the running totals
+        of its whole hours and the messages either side of them.
+
+        Returns an array of (bins, people, sums), with the window split into
+        bins at the int64 ns dates in bounds, which must fall on hours, and
+        an array of (hours of the week, people) of the messages in each.
+        """
+        start, stop, partial = self._split_hours()
+        prefix_sums = self._index.prefix_sums
+        bounds = np.asarray(bounds, dtype=np.int64)
+        sums = prefix_sums.totals(start, stop, bounds // _HOUR)
+        weekly = prefix_sums.weekly(start, stop)
+        codes = partial["name"].cat.codes.to_numpy()
+        named = codes != -1
+        dates = self._index.dates[partial.index.to_numpy()][named]
+        codes = codes[named]
+        values = _message_sums(partial)[named]
+        bins = np.searchsorted(bounds, dates, side="right")
+        _add_sums(sums, bins * sums.shape[1] + codes, values)
+        hours = _weekly_hour(dates // _HOUR)
+        _add_sums(
+            weekly[..., None],
+            hours * weekly.shape[1] + codes,
+            values[:, _MESSAGES : _MESSAGES + 1],
+        )
+        return sums, weekly
+
+    def _present(self, sums):
+        """
+        Returns the codes and names of the people of the chat who sent any
+        messages, by name, from their sums.
+        """
+        if self._codes is None:
+            codes = np.arange(len(self._index.names))
+        else:
+            codes = np.array(sorted(self._codes), dtype=np.intp)
+        codes = codes[sums[codes, _ROWS] > 0]
+        names = self._index.names[codes]
+        order = names.argsort()
+        return codes[order], pd.Index(names[order], dtype=object, name="name")
+
+    def _counts(self):
+        """
+        Looks up the message, word and character counts of the window, and
+        its hour and weekday counts, as ChatStats caches them.
+        """
+        sums, weekly = self._sums()
+        codes, names = self._present(sums[0])
+        counts = {
+            key: pd.Series(sums[0, codes, column], index=names, name="text")
+            for key, column in [
+                ("messages", _MESSAGES),
+                ("words", _WORDS),
+                ("chars", _CHARS),
+            ]
+        }
+        counts["hour_weekday"] = weekly[:, codes].T.reshape(len(codes), 7, 24)
+        return counts
+
+    def _timeline(self, freq):
+        """
+        Rolls the timeline of the window up from the running totals, for a
+        freq of whole hours, as ChatStats.timeline would count it.
+        """
+        first, last = (date // _HOUR * _HOUR for date in self._ends())
+        labels, bounds = _time_bin_bounds(first, last, freq)
+        sums, _ = self._sums(bounds)
+        codes, names = self._present(sums.sum(axis=0))
+        return pd.DataFrame(
+            sums[:, codes, _MESSAGES], index=labels.rename("date"), columns=names
+        )
+
+    def _block_aggregates(self, block):
+        blocks = self._index.blocks
+        key = (self._codes, block)
+        if key in blocks:
+            blocks.move_to_end(key)
+            return blocks[key]
+        start = block * _BLOCK_SIZE
+        rows = self._rows(start, start + _BLOCK_SIZE)
+        aggregates = _aggregate(rows, self._index.max_words)
+        blocks[key] = aggregates
+        if len(blocks) > _MAX_BLOCKS:
+            blocks.popitem(last=False)
+        return aggregates
+
+    def _aggregates(self):
+        """
+        Merges the mergeable aggregates of the window from those of the whole
+        blocks in it and of the messages either side of them.
+        """
+        first = -(-self._start // _BLOCK_SIZE)
+        last = self._stop // _BLOCK_SIZE
+        if first >= last:
+            return None
+        aggregates = [self._block_aggregates(b) for b in range(first, last)]
+        if self._start < first * _BLOCK_SIZE:
+            head = self._rows(self._start, first * _BLOCK_SIZE)
+            aggregates.insert(0, _aggregate(head, self._index.max_words))
+        if last * _BLOCK_SIZE < self._stop:
+            tail = self._rows(last * _BLOCK_SIZE, self._stop)
+            aggregates.append(_aggregate(tail, self._index.max_words))
+        return functools.reduce(_merge_aggregates, aggregates)
+
+    @property
+    def stats(self):
+        """
+        ChatStats : The aggregates of the messages of the chat, which are kept
+        for as long as the chat is one of the last 64 windows used.
+        """
+        windows = self._index.windows
+        key = (self._start, self._stop, self._codes)
+        if key in windows:
+            windows.move_to_end(key)
+            return windows[key]
+        stats = _WindowStats(self)
+        windows[key] = stats
+        if len(windows) > _MAX_WINDOWS:
+            windows.popitem(last=False)
+        return stats
+
+    def __repr__(self):
+        dates = self._index.dates[self._start : self._stop]
+        if not len(dates):
+            return "<Chat of 0 messages>"
+        return "<Chat of {} messages from {} to {}>".format(
+            len(self), pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])
+        )
+
+
+class _WindowStats(ChatStats):
+    """
+    The ChatStats of the window of a Chat.
+
+    Its counts are looked up in the running totals of the chat, as are its
+    timelines of whole hours. The other mergeable aggregates are merged from
+    those of the blocks of the chat, the first time any of them is needed.
+    """
+
+    def __init__(self, chat):
+        self._df = chat.frame
+        self._chat = chat
+        self.max_words = chat._index.max_words
+        self.n_jobs = 1
+        self._cache = chat._counts()
+        self.names = list(self._cache["messages"].index)
+
+    def _get(self, key, compute):
+        if key in _MERGEABLE and key not in self._cache:
+            aggregates = self._chat._aggregates()
+            if aggregates is not None:
+                for aggregate_key, aggregate in aggregates.items():
+                    self._cache.setdefault(aggregate_key, aggregate)
+        return super()._get(key, compute)
+
+    def timeline(self, freq="MS", total=False):
+        key = ("timeline", freq)
+        if (
+            not total
+            and key not in self._cache
+            and self._df is not None
+            and self.names
+            and _rolls_up_from_hours(freq)
+        ):
+            self._cache[key] = self._chat._timeline(freq)
+        return super().timeline(freq, total)
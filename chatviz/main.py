@@ -1,6 +1,12 @@
+import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
+import matplotlib.ticker as mticker
+import numpy as np
 
 from chatviz.plotting import (
+    _DAYS,
+    _HOURS,
+    _MAX_TIMELINE_BARS,
     plot_donuts,
     plot_reply_times,
     plot_timeline,
@@ -9,8 +15,45 @@ from chatviz.plotting import (
     plot_words,
     plot_legend,
 )
+from chatviz.stats import _as_stats
 from chatviz.utils import _build_color_dict
 
+# the panels of a Dashboard, which can be redrawn on their own
+_PANELS = ("title", "donuts", "legend", "timeline", "words", "hours", "days", "reply")
+
+
+def _dashboard_axes(fig, n_people):
+    """
+    Lays out the axes of the dashboard on fig, returning them by panel.
+    """
+    gs = fig.add_gridspec(
+        4, 4, height_ratios=[0.2, 0.5, 0.2, 0.2], hspace=0.6, wspace=0.5
+    )
+    axes = {}
+    gsdonuts = gs[0, :3].subgridspec(1, 3)
+    axes["donuts"] = [fig.add_subplot(gsdonuts[i]) for i in range(3)]
+    axes["legend"] = fig.add_subplot(gs[0, 3])
+    axes["timeline"] = fig.add_subplot(gs[1, :])
+
+    gswords = gs[2, :].subgridspec(1, n_people, wspace=1.3)
+    axes["words_title"] = fig.add_subplot(gswords[:])
+    axes["words_title"].set_title("Most Used Words", y=1.1)
+    axes["words"] = [fig.add_subplot(gswords[i]) for i in range(n_people)]
+
+    gsradar = gs[3, 2:].subgridspec(1, 2)
+    ax_radar_title = fig.add_subplot(gsradar[:])
+    ax_radar_title.set_title("Distribution of Message Times", y=1.2)
+    ax_radar_title.axis(False)
+    axes["hours"] = fig.add_subplot(gsradar[0], polar=True)
+    axes["days"] = fig.add_subplot(gsradar[1], polar=True)
+
+    gsreply = gs[3, :2].subgridspec(1, 2)
+    ax_reply_title = fig.add_subplot(gsreply[:])
+    ax_reply_title.axis(False)
+    ax_reply_title.set_title("Average Time to Reply", y=1.2)
+    axes["reply"] = fig.add_subplot(gs[3, :2])
+    return axes
+
 
 def visualize_chat(
     df,
@@ -23,6 +66,7 @@ def visualize_chat(
     timeline_stacked=False,
     top_n_words=10,
     stopwords=None,
+    n_jobs=1,
 ):
     """
     Creates a series of plots given a dataframe of messages.
@@ -40,9 +84,10 @@ def visualize_chat(
 
     Parameters
     ----------
-    df : pd.DataFrame
+    df : pd.DataFrame or ChatStats
         The dataframe of messages. Must have the columns
-        ['date', 'name', 'text'].
+        ['date', 'name', 'text']. A ChatStats of the messages can be passed
+        instead, and is reused if it has already been used for other plots.
     title : str
         The title for the plot.
     colors : {'default'} or list of str or dict
@@ -77,6 +122,9 @@ def visualize_chat(
         If None, all words will be kept (Note: this will lead to poor results
         as 'the', 'and', 'a', 'is' etc. will be the top words. A stopword list
         is recommended).
+    n_jobs : int
+        The number of processes used to aggregate the messages, see
+        `ChatStats`. Default is 1. Ignored if df is already a ChatStats.
 
     Returns
     -------
@@ -92,30 +140,21 @@ def visualize_chat(
 
     .. plot:: ../examples/complete_example.py
     """
+    # every plot is drawn from the same aggregates, computed once
+    df = _as_stats(df, n_jobs=n_jobs)
     fig = plt.figure()
-    gs = fig.add_gridspec(
-        4, 4, height_ratios=[0.2, 0.5, 0.2, 0.2], hspace=0.6, wspace=0.5
-    )
+    axes = _dashboard_axes(fig, len(df.names))
 
     color_dict = _build_color_dict(colors, df)
 
-    gsdonuts = gs[0, :3].subgridspec(1, 3)
-    ax_donuts = [
-        fig.add_subplot(gsdonuts[0]),
-        fig.add_subplot(gsdonuts[1]),
-        fig.add_subplot(gsdonuts[2]),
-    ]
-    plot_donuts(df, ax=ax_donuts, colors=color_dict)
-
-    ax_legend = fig.add_subplot(gs[0, 3])
-    # plot_reply_times(df, ax=ax_reply, colors=color_dict)
-    plot_legend(color_dict, ax=ax_legend)
+    plot_donuts(df, ax=axes["donuts"], colors=color_dict)
 
-    ax_timeline = fig.add_subplot(gs[1, :])
+    # plot_reply_times(df, ax=ax_reply, colors=color_dict)
+    plot_legend(color_dict, ax=axes["legend"])
 
     plot_timeline(
         df,
-        ax=ax_timeline,
+        ax=axes["timeline"],
         colors=color_dict if timeline_stacked else [timeline_color],
         freq=timeline_freq,
         tick_format=timeline_tick_format,
@@ -123,35 +162,350 @@ def visualize_chat(
         stacked=timeline_stacked,
     )
 
-    gswords = gs[2, :].subgridspec(1, len(set(df["name"])), wspace=1.3)
-    ax_words_title = fig.add_subplot(gswords[:])
-    ax_words_title.set_title("Most Used Words", y=1.1)
     if len(color_dict) > 1:
-        ax_words_title.axis(False)
-    ax_words = [fig.add_subplot(gswords[i]) for i in range(len(set(df["name"])))]
+        axes["words_title"].axis(False)
     plot_words(
-        df, ax=ax_words, colors=color_dict, top_n=top_n_words, stopwords=stopwords
+        df,
+        ax=axes["words"],
+        colors=color_dict,
+        top_n=top_n_words,
+        stopwords=stopwords,
     )
 
-    gsradar = gs[3, 2:].subgridspec(1, 2)
-    ax_radar_title = fig.add_subplot(gsradar[:])
-    ax_radar_title.set_title("Distribution of Message Times", y=1.2)
-    ax_radar_title.axis(False)
-    hour_radar_ax = fig.add_subplot(gsradar[0], polar=True)
-    plot_hours_radar(df, ax=hour_radar_ax, colors=colors)
-    day_radar_ax = fig.add_subplot(gsradar[1], polar=True)
-    plot_days_radar(df, ax=day_radar_ax, colors=color_dict)
+    plot_hours_radar(df, ax=axes["hours"], colors=colors)
+    plot_days_radar(df, ax=axes["days"], colors=color_dict)
 
-    gsreply = gs[3, :2].subgridspec(1, 2)
-    ax_reply_title = fig.add_subplot(gsreply[:])
-    ax_reply_title.axis(False)
-    ax_reply_title.set_title("Average Time to Reply", y=1.2)
-    ax_reply = fig.add_subplot(gs[3, :2])
-    plot_reply_times(df, ax=ax_reply, colors=color_dict)
+    plot_reply_times(df, ax=axes["reply"], colors=color_dict)
 
     fig.suptitle(title, y=0.95)
     return fig
 
 
+class Dashboard:
+    """
+    A dashboard figure which is laid out once and then redrawn for each chat.
+
+    `visualize_chat` builds a new figure with around 15 axes every time it is
+    called, which is most of the time it takes for a small chat. A Dashboard
+    builds the figure, axes and artists once, and `draw` only updates their
+    data, so rendering many chats of the same number of people in one
+    process is much faster. The dashboard looks like the one from
+    `visualize_chat`, except that the radar plots always have every hour and
+    day, and the word plots always have room for top_n_words words.
+
+    Parameters
+    ----------
+    n_people : int
+        The number of people in the chats which will be drawn.
+    top_n_words : int
+        The number of top words to include in the words bar charts. Default
+        is 10.
+    stopwords : None or iterable
+        If given, then these words will be removed from the words bar charts.
+    timeline_freq : str
+        The offset string for the bins of the timeline. Default is 'MS'.
+    timeline_tick_format : str
+        The format string for the dates under the timeline.
+    timeline_tick_step : int
+        The number of bins between the ticks of the timeline.
+    timeline_color : str
+        The color of the timeline, if not stacked.
+    timeline_stacked : bool
+        If True, then the timeline is split by person.
+
+    Attributes
+    ----------
+    fig : plt.Figure
+        The figure, which is the same for every chat drawn.
+
+    Examples
+    --------
+    >>> from chatviz.utils import load_example_chat_data
+    >>> df = load_example_chat_data()
+    >>> dashboard = Dashboard(5)
+    >>> fig = dashboard.draw(df, "Flying Circus")
+    >>> fig = dashboard.draw(df[df["date"] < "2019-11-01"], "The first half")
+    """
+
+    def __init__(
+        self,
+        n_people,
+        top_n_words=10,
+        stopwords=None,
+        timeline_freq="MS",
+        timeline_tick_format="%b '%y",
+        timeline_tick_step=6,
+        timeline_color="C0",
+        timeline_stacked=False,
+    ):
+        self.n_people = n_people
+        self.top_n_words = top_n_words
+        self.stopwords = stopwords
+        self.timeline_freq = timeline_freq
+        self.timeline_tick_format = timeline_tick_format
+        self.timeline_tick_step = timeline_tick_step
+        self.timeline_color = timeline_color
+        self.timeline_stacked = timeline_stacked
+
+        self.fig = plt.figure()
+        self._axes = _dashboard_axes(self.fig, n_people)
+        if n_people > 1:
+            self._axes["words_title"].axis(False)
+        self._title = self.fig.suptitle("", y=0.95)
+        people = range(n_people)
+
+        self._donuts = []
+        for ax in self._axes["donuts"]:
+            wedges, _, labels = ax.pie(
+                [1] * n_people,
+                wedgeprops=dict(width=0.3),
+                startangle=90,
+                autopct=lambda pct: "",
+                pctdistance=0.45,
+            )
+            self._donuts.append((wedges, labels))
+
+        self._legend = self._axes["legend"].legend(
+            handles=[mpatches.Patch(label=" ") for _ in people],
+            loc="center",
+            frameon=False,
+        )
+        self._axes["legend"].axis("off")
+
+        ax = self._axes["timeline"]
+        ax.spines["right"].set_visible(False)
+        ax.spines["top"].set_visible(False)
+        ax.set_xlabel("Date", labelpad=20)
+        ax.set_ylabel("Count", labelpad=20)
+        ax.set_title("Message Timeline")
+        ax.tick_params(axis="x", labelrotation=45)
+        # bars are added as longer timelines need them, and hidden otherwise,
+        # and timelines too long for bars are drawn as filled steps
+        series = people if timeline_stacked else [0]
+        self._timeline = [[] for _ in series]
+        self._timeline_steps = [
+            ax.stairs([0], [0, 1], fill=True, visible=False) for _ in series
+        ]
+
+        self._words = []
+        for ax in self._axes["words"]:
+            bars = ax.barh(range(top_n_words), [0] * top_n_words)
+            ax.spines["right"].set_visible(False)
+            ax.spines["top"].set_visible(False)
+            # more bars are added if top_n_words is raised later
+            self._words.append(list(bars))
+
+        self._radars = {}
+        for key, labels in [("hours", _HOURS), ("days", _DAYS)]:
+            ax = self._axes[key]
+            angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False)
+            lines, fills = [], []
+            for _ in people:
+                values = np.zeros(len(labels) + 1)
+                (line,) = ax.plot(np.append(angles, 0), values, linewidth=3)
+                (fill,) = ax.fill(np.append(angles, 0), values, alpha=0.1)
+                lines.append(line)
+                fills.append(fill)
+            ax.set_xticks(angles)
+            ax.set_xticklabels(labels)
+            ax.set_rlabel_position(0)
+            ax.tick_params(axis="both", colors="grey")
+            ax.tick_params(axis="y", labelrotation=45)
+            ax.tick_params(axis="x", pad=20)
+            self._radars[key] = (lines, fills)
+
+        ax = self._axes["reply"]
+        self._reply = ax.barh(range(n_people), [0] * n_people, height=0.5)
+        ax.spines["right"].set_visible(False)
+        ax.spines["top"].set_visible(False)
+        ax.set_yticks([])
+        ax.set_xlabel("Hours")
+
+    def draw(self, df, title, colors="default", panels=None):
+        """
+        Draws the dashboard of a chat, replacing the last one drawn.
+
+        Parameters
+        ----------
+        df : pd.DataFrame or ChatStats
+            The dataframe of messages, or the ChatStats of it. Must have the
+            columns ['date', 'name', 'text'], and n_people names.
+        title : str
+            The title for the plot.
+        colors : {'default'} or list of str or dict
+            The colors to be used for each person in the chat, as for
+            `visualize_chat`.
+        panels : iterable of str or None
+            The panels to redraw, out of 'title', 'donuts', 'legend',
+            'timeline', 'words', 'hours', 'days' and 'reply', leaving the
+            rest as they were last drawn. For example, after changing
+            `timeline_freq` of the same chat only the 'timeline' needs to be
+            redrawn. If None (default), every panel is drawn.
+
+        Returns
+        -------
+        plt.Figure
+            The dashboard figure.
+        """
+        panels = _PANELS if panels is None else set(panels)
+        unknown = set(panels).difference(_PANELS)
+        if unknown:
+            raise ValueError(
+                "Unknown panels {}, the panels are {}".format(
+                    sorted(unknown), ", ".join(_PANELS)
+                )
+            )
+        stats = _as_stats(df)
+        if len(stats.names) != self.n_people:
+            raise ValueError(
+                "The dashboard is laid out for {} people, but the chat has "
+                "{}".format(self.n_people, len(stats.names))
+            )
+        color_dict = _build_color_dict(colors, stats)
+        if "title" in panels:
+            self._title.set_text(title)
+        if "donuts" in panels:
+            self._draw_donuts(stats, color_dict)
+        if "legend" in panels:
+            for patch, text, (name, color) in zip(
+                self._legend.get_patches(),
+                self._legend.get_texts(),
+                color_dict.items(),
+            ):
+                patch.set_facecolor(color)
+                text.set_text(name)
+        if "timeline" in panels:
+            self._draw_timeline(stats, color_dict)
+        if "words" in panels:
+            self._draw_words(stats, color_dict)
+        if "hours" in panels:
+            self._draw_radar("hours", stats.hour_counts, color_dict)
+        if "days" in panels:
+            self._draw_radar("days", stats.weekday_counts, color_dict)
+        if "reply" in panels:
+            self._draw_reply_times(stats, color_dict)
+        return self.fig
+
+    def _draw_donuts(self, stats, color_dict):
+        names = list(color_dict)[::-1]
+        counts = [stats.message_counts, stats.word_counts, stats.char_counts]
+        titles = ["messages", "words", "characters"]
+        for ax, (wedges, labels), total, title in zip(
+            self._axes["donuts"], self._donuts, counts, titles
+        ):
+            values = total.reindex(names, fill_value=0).to_numpy()
+            fractions = values / max(values.sum(), 1)
+            # as ax.pie places them, anticlockwise from the top
+            ends = 0.25 + np.cumsum(fractions)
+            starts = ends - fractions
+            for wedge, label, start, end, value, name in zip(
+                wedges, labels, starts, ends, values, names
+            ):
+                wedge.set_theta1(360 * start)
+                wedge.set_theta2(360 * end)
+                wedge.set_facecolor(color_dict[name])
+                middle = np.pi * (start + end)
+                label.set_position((0.45 * np.cos(middle), 0.45 * np.sin(middle)))
+                label.set_text("{:d}".format(value))
+            ax.set_title(f"Number of {title}\nTotal: {values.sum()}")
+
+    def _draw_timeline(self, stats, color_dict):
+        ax = self._axes["timeline"]
+        counts = stats.timeline(self.timeline_freq, total=not self.timeline_stacked)
+        if self.timeline_stacked:
+            names = list(color_dict)[::-1]
+            heights = counts.reindex(columns=names, fill_value=0).to_numpy().T
+            colors = [color_dict[n] for n in names]
+        else:
+            heights = [counts.to_numpy()]
+            colors = [self.timeline_color]
+        use_bars = len(counts) <= _MAX_TIMELINE_BARS
+        edges = np.arange(len(counts) + 1) - 0.5
+        bottom = np.zeros(len(counts))
+        for bars, steps, height, color in zip(
+            self._timeline, self._timeline_steps, heights, colors
+        ):
+            while use_bars and len(bars) < len(counts):
+                bars.extend(ax.bar(len(bars), 0, width=0.75))
+            for i, bar in enumerate(bars):
+                bar.set_visible(use_bars and i < len(counts))
+                if use_bars and i < len(counts):
+                    bar.set_y(bottom[i])
+                    bar.set_height(height[i])
+                    bar.set_facecolor(color)
+            steps.set_visible(not use_bars)
+            if not use_bars:
+                steps.set_data(bottom + height, edges, baseline=bottom)
+                steps.set_facecolor(color)
+            bottom = bottom + height
+        ax.set_xlim(-0.5, len(counts) - 0.5)
+        ax.set_ylim(0, max(bottom.max(initial=0), 1) * 1.05)
+        step = self.timeline_tick_step
+        ax.set_xticks(range(len(counts))[::step])
+        ax.set_xticklabels(
+            [date.strftime(self.timeline_tick_format) for date in counts.index[::step]]
+        )
+
+    def _draw_words(self, stats, color_dict):
+        n_words = self.top_n_words
+        for ax, bars, (name, color) in zip(
+            self._axes["words"], self._words, color_dict.items()
+        ):
+            while len(bars) < n_words:
+                bars.extend(ax.barh(len(bars), 0))
+            top_words = stats.top_words(name, n_words, self.stopwords)
+            # the most used word at the top
+            labels = [""] * n_words
+            for i, bar in enumerate(bars[:n_words][::-1]):
+                count = top_words[i][1] if i < len(top_words) else 0
+                bar.set_width(count)
+                bar.set_facecolor(color)
+                if i < len(top_words):
+                    labels[n_words - 1 - i] = top_words[i][0]
+            for i, bar in enumerate(bars):
+                bar.set_visible(i < n_words)
+            ax.set_yticks(range(n_words))
+            ax.set_yticklabels(labels)
+            # as barh scales the axis to n_words bars, with 5% margins
+            margin = 0.05 * (n_words - 0.2)
+            ax.set_ylim(-0.4 - margin, n_words - 0.6 + margin)
+            ax.set_xlim(0, max([c for _, c in top_words] + [1]) * 1.05)
+
+    def _draw_radar(self, key, counts, color_dict):
+        ax = self._axes[key]
+        lines, fills = self._radars[key]
+        n_labels = len(ax.get_xticks())
+        counts = counts.reindex(index=list(color_dict), columns=range(n_labels))
+        counts = counts.fillna(0).to_numpy()
+        peak = 1
+        for line, fill, values, color in zip(lines, fills, counts, color_dict.values()):
+            values = np.append(values, values[0])
+            line.set_ydata(values)
+            line.set_color(color)
+            fill.set_xy(np.column_stack([line.get_xdata(), values]))
+            fill.set_facecolor(color)
+            peak = max(peak, np.max(values))
+        ax.set_ylim(0, peak * 1.05)
+        # the outer two rings are left unlabelled, as in plot_radar
+        ticks = mticker.AutoLocator().tick_values(0, peak * 1.05)
+        ticks = ticks[(ticks >= 0) & (ticks <= peak * 1.05)]
+        ax.set_yticks(ticks)
+        ax.set_yticklabels([str(int(i)) for i in ticks[:-2]] + ["", ""][: len(ticks)])
+
+    def _draw_reply_times(self, stats, color_dict):
+        ax = self._axes["reply"]
+        names = list(color_dict)[::-1]
+        reply_times = stats.reply_times
+        # nobody replied to anybody, as in plot_reply_times
+        ax.axis("off" if reply_times is None else "on")
+        if reply_times is None:
+            return
+        hours = reply_times.reindex(names).fillna(0).to_numpy()
+        for bar, value, name in zip(self._reply, hours, names):
+            bar.set_width(value)
+            bar.set_facecolor(color_dict[name])
+        ax.set_xlim(0, max(hours.max(initial=0), 1e-9) * 1.05)
+
+
 # TODO: add a quickstart and a gallery with a few examples
 # TODO: upload to github and pypi
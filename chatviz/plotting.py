@@ -1,13 +1,20 @@
-import re
-from collections import Counter
-
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
+from chatviz.stats import _as_stats
 from chatviz.utils import _map_colors, _build_color_dict
 
+_HOURS = (
+    ["12am"]
+    + ["{}am".format(i) for i in range(1, 12)]
+    + ["12pm"]
+    + ["{}pm".format(i) for i in range(1, 12)]
+)
+_DAYS = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun"]
+# timelines with more bins than this are drawn as filled steps, not bars
+_MAX_TIMELINE_BARS = 200
+
 
 def plot_timeline(
     df,
@@ -24,13 +31,14 @@ def plot_timeline(
 
     The size of the bins in the bar chart can be adjusted via `freq`, and there
     are other options to control whether or not to create a stacked bar chart.
-    See the examples below for more information.
+    See the examples below for more information. Timelines of more than 200
+    bins are drawn as filled steps instead of bars, which is much faster.
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['date', 'text'], as
-        well as a 'name' columns if stacked=True.
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['date', 'name', 'text'].
     ax : plt.Axes or None
         The axes to plot onto. If None (default), will create a new axes.
     freq: str
@@ -101,35 +109,21 @@ def plot_timeline(
     """
     if ax is None:
         ax = plt.subplot(111)
-    df2 = df.copy()
+    stats = _as_stats(df)
     if stacked:
-        df2 = (
-            df2.groupby([pd.Grouper(key="date", freq=freq), "name"])
-            .count()
-            .unstack("name")
-            .fillna(0)
-            .resample(freq)
-            .sum()
-        )
-        color_dict = _build_color_dict(colors, df)
-        cats = list(color_dict.keys())[::-1]
-        df2 = df2.reindex(cats, axis=1, level=1)
-        df2["text"].plot(
-            kind="bar",
-            stacked=True,
-            width=0.75,
-            color=_map_colors(colors, df2["text"].transpose()),
-            ax=ax,
-            rot=45,
-        )
+        counts = stats.timeline(freq)
+        color_dict = _build_color_dict(colors, stats)
+        cats = [n for n in list(color_dict.keys())[::-1] if n in counts.columns]
+        df2 = counts[cats]
+        bar_colors = _map_colors(colors, df2.transpose())
     else:
-        df2 = df2.resample(freq, on="date").count()
-        df2["text"].plot(
-            kind="bar",
-            width=0.75,
-            color=list(_build_color_dict(colors, df).values())[0],
-            ax=ax,
-            rot=45,
+        df2 = stats.timeline(freq, total=True)
+        bar_colors = list(_build_color_dict(colors, stats).values())[0]
+    if len(df2) > _MAX_TIMELINE_BARS:
+        _plot_steps(df2, ax, bar_colors if stacked else [bar_colors])
+    else:
+        df2.plot(
+            kind="bar", stacked=stacked, width=0.75, color=bar_colors, ax=ax, rot=45
         )
     ax.spines["right"].set_visible(False)
     ax.spines["top"].set_visible(False)
@@ -140,17 +134,30 @@ def plot_timeline(
     ax.set_title("Message Timeline")
     ax.xaxis.labelpad = 20
     ax.yaxis.labelpad = 20
-    if stacked:
-        if legend:
-            patches = [
-                mpatches.Patch(facecolor=c, label=n) for n, c in color_dict.items()
-            ]
-            ax.legend(handles=patches, loc="upper right")
-        else:
-            ax.get_legend().remove()
+    if stacked and legend:
+        patches = [mpatches.Patch(facecolor=c, label=n) for n, c in color_dict.items()]
+        ax.legend(handles=patches, loc="upper right")
+    elif ax.get_legend() is not None:
+        ax.get_legend().remove()
     return ax
 
 
+def _plot_steps(counts, ax, colors):
+    """
+    Draws the counts of a timeline as one filled step patch per column,
+    stacked on top of each other, in place of one bar per bin.
+    """
+    heights = np.atleast_2d(counts.to_numpy().T)
+    edges = np.arange(heights.shape[1] + 1) - 0.5
+    bottom = np.zeros(heights.shape[1])
+    for height, color in zip(heights, colors):
+        ax.stairs(bottom + height, edges, baseline=bottom, fill=True, color=color)
+        bottom = bottom + height
+    ax.set_xlim(edges[0], edges[-1])
+    ax.set_ylim(bottom=0)
+    ax.tick_params(axis="x", labelrotation=45)
+
+
 def plot_one_donut(df, title, ax, colors, show_ylabels=False):
     def func(pct, allvals):
         absolute = int(pct / 100.0 * np.sum(allvals))
@@ -183,9 +190,9 @@ def plot_donuts(df, ax=None, colors="default", show_ylabels=False):
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['date', 'text',
-        'name'].
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['date', 'text', 'name'].
     ax : plt.Axes or None
         This should be an iterable of 3 axes, such as the one generated from
         _, ax = plt.subplots(1, 3). If None (default), will create 3 new axes.
@@ -217,59 +224,18 @@ def plot_donuts(df, ax=None, colors="default", show_ylabels=False):
 
     if ax is None:
         _, ax = plt.subplots(1, 3)
-    pie_messages = df.groupby("name").count()[["text"]]
+    stats = _as_stats(df)
+    pie_messages = stats.message_counts.to_frame("text")
     ax[0] = plot_one_donut(pie_messages, "messages", ax[0], colors, show_ylabels)
 
-    pie_words = df.groupby("name")[["text"]].aggregate(
-        lambda x: sum(
-            len(re.sub(r"[^a-zA-Z0-9]+", " ", i).strip().split()) for i in x.fillna("")
-        )
-    )
+    pie_words = stats.word_counts.to_frame("text")
     ax[1] = plot_one_donut(pie_words, "words", ax[1], colors, show_ylabels)
 
-    pie_chars = df.groupby("name")[["text"]].aggregate(
-        lambda x: sum(len(i) for i in x.fillna(""))
-    )
+    pie_chars = stats.char_counts.to_frame("text")
     ax[2] = plot_one_donut(pie_chars, "characters", ax[2], colors, show_ylabels)
     return ax
 
 
-def _create_reply_time_df(df):
-    """
-    Calculates the per person reply times in hours.
-
-    Parameters
-    ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['date', 'name'].
-
-    Returns
-    -------
-    pd.Series
-        A series with the reply times in hours for each person in df['name'].
-    """
-    reply_times = []
-    last_time = None
-    last_person = None
-    for d, n in df[["date", "name"]].values:
-        if last_time is None:
-            last_time = d
-            last_person = n
-            continue
-        if n != last_person:
-            reply_time = d - last_time
-            last_person = n
-            last_time = d
-            reply_times.append([reply_time, n])
-    if not reply_times:
-        return None
-    reply_df = pd.DataFrame(reply_times, columns=["reply_time", "name"])
-    reply_df["reply_seconds"] = reply_df["reply_time"].dt.total_seconds()
-    reply_data = reply_df.groupby("name")["reply_seconds"].mean() / 3600
-    reply_data.name = "reply_hours"
-    return reply_data
-
-
 def plot_reply_times(df, ax=None, colors="default", show_ylabels=False):
     """
     Creates a horizontal bar chart showing the average reply time in hours
@@ -281,8 +247,9 @@ def plot_reply_times(df, ax=None, colors="default", show_ylabels=False):
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['date', 'name'].
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['date', 'name'].
     ax : plt.Axes or None
         The axes to plot onto. If None (default), will create a new axes.
     colors : {'default'} or list of str or dict
@@ -314,11 +281,12 @@ def plot_reply_times(df, ax=None, colors="default", show_ylabels=False):
         ax = plt.subplot(111)
     ax.spines["right"].set_visible(False)
     ax.spines["top"].set_visible(False)
-    reply_data = _create_reply_time_df(df)
+    stats = _as_stats(df)
+    reply_data = stats.reply_times
     if reply_data is None:
         ax.axis("off")
         return ax
-    color_dict = _build_color_dict(colors, df)
+    color_dict = _build_color_dict(colors, stats)
     reply_data = reply_data[list(color_dict.keys())[::-1]]
     reply_data.plot(kind="barh", color=_map_colors(color_dict, reply_data), ax=ax)
     ax.set_ylabel("")
@@ -328,51 +296,21 @@ def plot_reply_times(df, ax=None, colors="default", show_ylabels=False):
     return ax
 
 
-def _word_counts(df, stopwords):
-    """
-    Gets the word counts for each person in the df.
-
-    Lower cases the words and removes all punctuation and numbers except '_'.
-    Parameters
-    ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['name', 'text'].
-
-    Returns
-    -------
-    dict
-        A dictionary of (name, Counter), where the Counter contains word counts.
-    """
-    df2 = df.copy()
-
-    def clean_text(s):
-        return re.sub(r"[^a-z_]+", " ", s.lower()).strip().split()
-
-    if stopwords is None:
-        stopwords = set()
-    else:
-        stopwords = set(clean_text(" ".join(stopwords)))
-    df2["words"] = (
-        df2["text"]
-        .fillna("")
-        .apply(lambda x: [w for w in clean_text(x) if w not in stopwords])
-    )
-    count_dicts = {
-        name: Counter(sub_df["words"].sum()) for (name, sub_df) in df2.groupby("name")
-    }
-    return count_dicts
-
-
 def plot_words(
     df, ax=None, top_n=10, stopwords=None, colors="default", show_titles=False
 ):
     """
     Plots a bar chart per person with their top words used.
 
+    Every distinct word is counted, which can take a lot of memory on a large
+    chat. To count the top words approximately in a fixed amount of memory,
+    pass a ``ChatStats(df, max_words=...)`` as df instead.
+
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['name', 'text'].
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['name', 'text'].
     ax : plt.Axes or None
         This should be an iterable of M axes, where M is the number of unique
         names in df['name']. If None (default), will create M new axes, via
@@ -413,13 +351,12 @@ def plot_words(
     .. plot:: ../examples/words_example2.py
        :width: 800px
     """
-    counts = _word_counts(df, stopwords)
+    stats = _as_stats(df)
     if ax is None:
-        _, ax = plt.subplots(1, len(counts))
-    color_dict = _build_color_dict(colors, df)
+        _, ax = plt.subplots(1, len(stats.word_counters))
+    color_dict = _build_color_dict(colors, stats)
     for ind, (name, color) in enumerate(color_dict.items()):
-        name_counts = counts.get(name, Counter())
-        top_words = name_counts.most_common(top_n)
+        top_words = stats.top_words(name, top_n, stopwords)
         ax[ind].barh(
             [i[0] for i in top_words][::-1],
             [i[1] for i in top_words][::-1],
@@ -494,8 +431,9 @@ def plot_days_radar(df, ax=None, colors="default", legend=False):
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['name', 'date'].
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['name', 'date'].
     ax : plt.Axes or None
         This should be a polar axes. If None (default), one will be created
         with ax = plt.subplot(polar=True).
@@ -528,15 +466,8 @@ def plot_days_radar(df, ax=None, colors="default", legend=False):
     .. plot:: ../examples/radar_day_example.py
        :width: 800px
     """
-    df = df.copy()
-    df["label"] = df["date"].dt.dayofweek
-    days = ["Mon", "Tues", "Wed", "Thurs", "Fri", "Sat", "Sun"]
-    df = (
-        df.groupby(["name", "label"], as_index=False)["text"]
-        .count()
-        .pivot(index="name", columns="label", values="text")
-    )
-    df = df.rename(columns={i: days[i] for i in df.columns})
+    df = _as_stats(df).weekday_counts
+    df = df.rename(columns={i: _DAYS[i] for i in df.columns})
     return plot_radar(df, ax=ax, colors=colors, legend=legend)
 
 
@@ -547,8 +478,9 @@ def plot_hours_radar(df, ax=None, colors="default", legend=False):
 
     Parameters
     ----------
-    df : pd.DataFrame
-        The dataframe of messages. Must have the columns ['name', 'date'].
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['name', 'date'].
     ax : plt.Axes or None
         This should be a polar axes. If None (default), one will be created
         with ax = plt.subplot(polar=True).
@@ -575,23 +507,68 @@ def plot_hours_radar(df, ax=None, colors="default", legend=False):
     .. plot:: ../examples/radar_hour_example.py
        :width: 800px
     """
-    df = df.copy()
-    df["label"] = df["date"].dt.hour
-    hours = (
-        ["12am"]
-        + ["{}am".format(i) for i in range(1, 12)]
-        + ["12pm"]
-        + ["{}pm".format(i) for i in range(1, 12)]
-    )
-    df = (
-        df.groupby(["name", "label"], as_index=False)["text"]
-        .count()
-        .pivot(index="name", columns="label", values="text")
-    )
-    df = df.rename(columns={i: hours[i] for i in df.columns})
+    df = _as_stats(df).hour_counts
+    df = df.rename(columns={i: _HOURS[i] for i in df.columns})
     return plot_radar(df, ax=ax, colors=colors, legend=legend)
 
 
+def plot_hour_weekday_heatmap(df, ax=None, name=None, cmap="Blues", colorbar=True):
+    """
+    Creates a heatmap of the number of messages sent in each hour of each day
+    of the week.
+
+    The counts come from the same per person counts as `plot_hours_radar`
+    and `plot_days_radar`, so drawing all three only counts the messages
+    once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame or ChatStats
+        The dataframe of messages, or the ChatStats of it. Must have the
+        columns ['name', 'date'].
+    ax : plt.Axes or None
+        The axes to plot onto. If None (default), will create a new axes.
+    name : str or None
+        If given, only the messages sent by this person are counted. If None
+        (default), the messages of everybody are counted.
+    cmap : str or matplotlib.colors.Colormap
+        The colormap of the heatmap. Default is 'Blues'.
+    colorbar : bool
+        If True (default), a colorbar is added next to the heatmap.
+
+    Returns
+    -------
+    plt.Axes
+        The heatmap axes plot, with the days as rows and the hours as columns.
+
+    See Also
+    --------
+    plot_hours_radar, plot_days_radar
+
+    Examples
+    --------
+    .. plot:: ../examples/heatmap_example.py
+       :width: 800px
+    """
+    if ax is None:
+        ax = plt.subplot(111)
+    counts = _as_stats(df).hour_weekday_counts
+    if name is None:
+        counts = counts.groupby(level="weekday").sum()
+    else:
+        counts = counts.loc[name]
+    counts = counts.reindex(index=range(7), fill_value=0)
+    image = ax.imshow(counts.to_numpy(), cmap=cmap, aspect="auto")
+    ax.set_xticks(range(24))
+    ax.set_xticklabels(_HOURS, rotation=45)
+    ax.set_yticks(range(7))
+    ax.set_yticklabels(_DAYS)
+    ax.set_title("Messages by Hour and Day")
+    if colorbar:
+        ax.figure.colorbar(image, ax=ax, label="Count")
+    return ax
+
+
 def plot_legend(color_dict, ax=None):
     if ax is None:
         ax = plt.subplot(111)
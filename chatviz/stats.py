@@ -0,0 +1,1179 @@
+"""
+Per person statistics of a chat, shared between the plots.
+"""
+
+import copy
+import functools
+import heapq
+import itertools
+import json
+import os
+import re
+from collections import Counter
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# a word, as counted in the donut plots, is a run of ASCII letters and numbers
+_WORD_BYTES = np.zeros(256, dtype=bool)
+for _chars in (
+    b"abcdefghijklmnopqrstuvwxyz",
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    b"0123456789",
+):
+    _WORD_BYTES[np.frombuffer(_chars, dtype=np.uint8)] = True
+# messages are counted this many at a time, to bound the temporary arrays
+_LENGTHS_CHUNKSIZE = 2**20
+
+
+# a word, as counted in the word plots, is a run of letters and underscores
+_TOKEN = re.compile(r"[a-z_]+")
+# messages are tokenized this many at a time, to bound the lists of words
+_WORDS_CHUNKSIZE = 10000
+
+
+def _tokenize(s):
+    return _TOKEN.findall(s.lower())
+
+
+@functools.lru_cache(maxsize=16)
+def _stopword_set(stopwords):
+    """
+    Returns the tuple of stopwords as a set of words, tokenized the same way
+    as the messages. Cached, as the same stopwords are used for every person.
+    """
+    return frozenset(_tokenize(" ".join(stopwords)))
+
+
+def _reply_intervals(df):
+    """
+    Finds every reply in the chat, and how long it took.
+
+    A reply is a message sent by someone other than the sender of the message
+    before it. It took the time since the first message of the run of
+    messages it replies to.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe of messages, in time order. Must have the columns
+        ['date', 'name'].
+
+    Returns
+    -------
+    dict
+        'replies' is a DataFrame with one row per reply, in the order of df,
+        and the columns ['name', 'reply_ns'], where 'reply_ns' is the time it
+        took in nanoseconds. 'first' is the (name, date) of the first message
+        and 'last' is the (name, date) of the first message in the last run,
+        with dates in nanoseconds, so that replies across the boundary with
+        the messages before or after can be found by `_merge_replies`. Both
+        are None if df is empty.
+    """
+    codes, names = pd.factorize(df["name"])
+    dates = df["date"].to_numpy("datetime64[ns]").view(np.int64)
+    # messages with no name never match the one before
+    changed = (codes[1:] != codes[:-1]) | (codes[1:] == -1)
+    replies = np.flatnonzero(changed) + 1
+    runs = np.concatenate([[0], replies[:-1]])[: len(replies)]
+    names = np.append(np.asarray(names, dtype=object), None)
+    intervals = {
+        "replies": pd.DataFrame(
+            {"name": names[codes[replies]], "reply_ns": dates[replies] - dates[runs]}
+        ),
+        "first": None,
+        "last": None,
+    }
+    if len(df):
+        last = replies[-1] if len(replies) else 0
+        intervals["first"] = (names[codes[0]], dates[0])
+        intervals["last"] = (names[codes[last]], dates[last])
+    return intervals
+
+
+def _merge_replies(a, b):
+    """
+    Merges the reply intervals of two consecutive runs of messages, adding
+    the reply from a to b if there is one.
+    """
+    if a["first"] is None:
+        return b
+    if b["first"] is None:
+        return a
+    (name, date), (last_name, run_start) = b["first"], a["last"]
+    replies = b["replies"]
+    last = b["last"]
+    if name is None or name != last_name:
+        crossing = pd.DataFrame({"name": [name], "reply_ns": [date - run_start]})
+        replies = pd.concat([crossing, replies], ignore_index=True)
+    elif len(replies):
+        # the first run of b started in a
+        replies = replies.copy()
+        replies.loc[0, "reply_ns"] += date - run_start
+    else:
+        last = a["last"]
+    return {
+        "replies": pd.concat([a["replies"], replies], ignore_index=True),
+        "first": a["first"],
+        "last": last,
+    }
+
+
+def _compact_replies(intervals):
+    """
+    Sums the reply intervals of each person, so that they take the same
+    memory however many replies there were.
+
+    The first reply is kept as it is, as `_merge_replies` may add to it, and
+    the rest are summed into one row per person, with the number of replies
+    in the column 'count'. Only the mean reply times can be found from them.
+    """
+    replies = intervals["replies"]
+    if "count" not in replies:
+        replies = replies.assign(count=1)
+    replies = replies.assign(
+        # summed as floats, as the total of many replies can overflow int64
+        reply_ns=replies["reply_ns"].astype(np.float64),
+        count=replies["count"].fillna(1).astype(np.int64),
+    )
+    totals = replies.iloc[1:].groupby("name")[["reply_ns", "count"]].sum()
+    replies = pd.concat([replies.iloc[:1], totals.reset_index()], ignore_index=True)
+    return dict(intervals, replies=replies)
+
+
+def _count_table(df, labels):
+    """
+    Counts the messages with text sent by each person (columns) with each
+    label (rows), with 0 where there were none.
+    """
+    counts = (
+        df.groupby([labels.rename("label"), df["name"]], observed=True)["text"]
+        .count()
+        .unstack("name", fill_value=0)
+    )
+    counts.columns = pd.Index(counts.columns.astype(object), name="name")
+    return counts.sort_index().sort_index(axis=1)
+
+
+def _add_counts(a, b):
+    """
+    Adds two Series or DataFrames of counts, taking missing counts as 0.
+    """
+    total = a.add(b, fill_value=0).fillna(0).astype(np.int64)
+    if isinstance(total, pd.DataFrame):
+        return total.sort_index().sort_index(axis=1)
+    return total.sort_index()
+
+
+def _rolls_up_from_hours(freq):
+    """
+    Returns whether every bin of the offset freq is made up of whole hours.
+    """
+    offset = pd.tseries.frequencies.to_offset(freq)
+    if isinstance(offset, pd.offsets.Tick):
+        return offset.nanos % pd.Timedelta(hours=1).value == 0
+    return not isinstance(offset, pd.offsets.BusinessHour)
+
+
+def _time_bin_bounds(first, last, freq):
+    """
+    Returns the labels of the bins of freq which resample would use from the
+    int64 ns date first to last, and the int64 ns date at which each bin
+    after the first starts.
+    """
+    ends = pd.DatetimeIndex([first, last])
+    labels = pd.Series(0, index=ends).resample(freq).count().index
+    if pd.Grouper(freq=freq).closed == "right":
+        # only offsets of whole days, like 'W' and 'M', close on the right,
+        # and resample takes each bin to the end of the day it is labelled by
+        day = pd.Timedelta(days=1).value
+        return labels, labels.asi8[:-1] + day
+    return labels, labels.asi8[1:]
+
+
+def _time_bins(dates, freq):
+    """
+    Bins int64 ns dates into the bins of freq which resample would use.
+
+    Returns the labels of every bin from the first date to the last, and the
+    index of the bin of each date.
+    """
+    labels, bounds = _time_bin_bounds(dates.min(), dates.max(), freq)
+    return labels, np.searchsorted(bounds, dates, side="right")
+
+
+def _bin_counts(dates, codes, n_codes, freq, weights=None):
+    """
+    Counts dates with each code (rows) in each bin of freq (columns), with
+    one np.bincount over the flat codes x bins matrix.
+    """
+    labels, bins = _time_bins(dates, freq)
+    counts = np.bincount(
+        codes * len(labels) + bins, weights=weights, minlength=n_codes * len(labels)
+    )
+    return labels, counts.astype(np.int64).reshape(n_codes, len(labels))
+
+
+def _utf8_buffer(text):
+    """
+    Returns the UTF-8 bytes of every message in text joined together, and
+    the offsets of each message into them. Missing text is empty.
+    """
+    if isinstance(text.dtype, pd.StringDtype) and text.dtype.storage == "pyarrow":
+        import pyarrow as pa
+
+        array = pa.array(text.array)
+        offset_dtype = np.int64 if pa.types.is_large_string(array.type) else np.int32
+        _, offsets, data = array.buffers()
+        offsets = np.frombuffer(offsets, dtype=offset_dtype)[
+            array.offset : array.offset + len(array) + 1
+        ]
+        data = np.frombuffer(data, dtype=np.uint8) if data is not None else None
+        if data is None or not len(offsets):
+            data = np.zeros(0, dtype=np.uint8)
+        return data[offsets[0] : offsets[-1]], offsets.astype(np.int64) - offsets[0]
+    encoded = [
+        t.encode("utf-8", "surrogatepass") if isinstance(t, str) else b"" for t in text
+    ]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _count_words(text):
+    """
+    Counts the words in each message, where a word is a run of ASCII letters
+    and numbers.
+
+    Rather than splitting each message, this marks the bytes of the encoded
+    text which start a word, then counts the marks in each message.
+    """
+    counts = np.zeros(len(text), dtype=np.int64)
+    for start in range(0, len(text), _LENGTHS_CHUNKSIZE):
+        data, offsets = _utf8_buffer(text.iloc[start : start + _LENGTHS_CHUNKSIZE])
+        is_word = _WORD_BYTES[data]
+        starts = is_word.copy()
+        starts[1:] &= ~is_word[:-1]
+        # a word can't run on from the end of the previous message
+        firsts = offsets[:-1][offsets[:-1] < len(data)]
+        starts[firsts] = is_word[firsts]
+        message = np.searchsorted(offsets, np.flatnonzero(starts), side="right") - 1
+        counts[start : start + len(offsets) - 1] = np.bincount(
+            message, minlength=len(offsets) - 1
+        )
+    counts[text.isna().to_numpy()] = 0
+    return counts
+
+
+class SpaceSaving:
+    """
+    Approximate counts of the most common words, in a fixed amount of memory.
+
+    Keeps at most `capacity` words, using the Space-Saving algorithm of
+    Metwally, Agrawal and El Abbadi. A new word takes the place of the least
+    counted one, and inherits its count as an overestimate. With N words
+    counted in total:
+
+    - the count of a word is over by at most its error, and its error is at
+      most N / capacity, so count - error <= true count <= count.
+    - every word used more than N / capacity times is kept.
+
+    So the most common words and their counts are exact, as long as they are
+    used more than N / capacity times more than the words after them.
+
+    Parameters
+    ----------
+    capacity : int
+        The most words to keep.
+
+    Examples
+    --------
+    >>> words = SpaceSaving(2)
+    >>> words.update("spam spam eggs spam ham".split())
+    >>> words.most_common(1)
+    [('spam', 3)]
+    >>> words.error("ham")
+    1
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1, got {}".format(capacity))
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._errors = {}
+        # holds one (count, word) for every word kept, but the count is only
+        # updated when it reaches the top of the heap
+        self._heap = []
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, word):
+        return word in self._counts
+
+    def __getitem__(self, word):
+        return self._counts.get(word, 0)
+
+    def get(self, word, default=None):
+        return self._counts.get(word, default)
+
+    def items(self):
+        """
+        Returns the (word, count) of every word kept.
+        """
+        return self._counts.items()
+
+    def error(self, word):
+        """
+        Returns the most the count of word can be over by. For a word which
+        is not kept, this is the most it can have been used.
+        """
+        if word in self._errors:
+            return self._errors[word]
+        return self._floor() if len(self._counts) == self.capacity else 0
+
+    def update(self, words):
+        """
+        Counts words, which is either an iterable of words, or a mapping of
+        words to how many times they were used.
+        """
+        if not isinstance(words, Mapping):
+            words = Counter(words)
+        for word, count in words.items():
+            self.total += count
+            if word in self._counts:
+                self._counts[word] += count
+                continue
+            error = 0
+            if len(self._counts) == self.capacity:
+                error = self._floor()
+                _, evicted = heapq.heappop(self._heap)
+                del self._counts[evicted], self._errors[evicted]
+            self._counts[word] = error + count
+            self._errors[word] = error
+            heapq.heappush(self._heap, (error + count, word))
+
+    def merge(self, other):
+        """
+        Adds the words counted by another SpaceSaving of the same capacity.
+
+        A word missing from one of them may have been used as many times as
+        its error there, so it is counted as that. The merged counts are
+        still over by at most their error, and errors are still at most N /
+        capacity, with N the number of words counted by both.
+        """
+        counts = {}
+        errors = {}
+        for word in itertools.chain(self._counts, other._counts):
+            if word not in counts:
+                counts[word] = self.get(word, self.error(word)) + other.get(
+                    word, other.error(word)
+                )
+                errors[word] = self.error(word) + other.error(word)
+        kept = heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1))
+        self.total += other.total
+        self._counts = dict(kept)
+        self._errors = {word: errors[word] for word in self._counts}
+        self._heap = [(count, word) for word, count in kept]
+        heapq.heapify(self._heap)
+
+    def most_common(self, n=None):
+        """
+        Returns the n most counted words and their counts, most counted
+        first, or all of them if n is None.
+        """
+        if n is None:
+            return sorted(self._counts.items(), key=itemgetter(1), reverse=True)
+        return heapq.nlargest(n, self._counts.items(), key=itemgetter(1))
+
+    def _floor(self):
+        # brings the least counted word on the heap up to date
+        while True:
+            count, word = self._heap[0]
+            if self._counts[word] == count:
+                return count
+            heapq.heapreplace(self._heap, (self._counts[word], word))
+
+
+def _word_counts(df, max_words=None):
+    """
+    Gets the word counts for each person in the df.
+
+    Lower cases the words and removes all punctuation and numbers except '_'.
+    The messages are tokenized a chunk at a time into each person's Counter,
+    so memory grows with the number of distinct words rather than the total
+    number of words.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe of messages. Must have the columns ['name', 'text'].
+    max_words : int or None
+        If given, then each person's words are counted approximately in a
+        SpaceSaving of this capacity rather than a Counter.
+
+    Returns
+    -------
+    dict
+        A dictionary of (name, Counter), where the Counter contains word counts.
+    """
+    codes, names = pd.factorize(df["name"])
+    if max_words is None:
+        counters = [Counter() for _ in names]
+    else:
+        counters = [SpaceSaving(max_words) for _ in names]
+    for start in range(0, len(df), _WORDS_CHUNKSIZE):
+        chunk = slice(start, start + _WORDS_CHUNKSIZE)
+        text = df["text"].iloc[chunk].to_numpy(object, na_value="")
+        chunk_codes = codes[chunk]
+        # group the chunk by person, keeping their messages in order
+        order = np.argsort(chunk_codes, kind="stable")
+        groups = np.split(order, np.flatnonzero(np.diff(chunk_codes[order])) + 1)
+        for group in groups:
+            code = chunk_codes[group[0]]
+            if code == -1:
+                continue
+            # the newlines keep words in different messages apart
+            words = _tokenize("\n".join(text[group]))
+            counters[code].update(words if max_words is None else Counter(words))
+    names = names.astype(object)
+    return {names[i]: counters[i] for i in np.argsort(names)}
+
+
+class ChatStats:
+    """
+    The per person aggregates of a chat which the plots are built from.
+
+    Every plot function accepts a ChatStats in place of a DataFrame of
+    messages. Building one up front and passing it to each plot means that
+    every aggregate is computed from the messages once, however many plots
+    use it. Each aggregate is computed the first time it is needed and then
+    kept.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The dataframe of messages, in time order. Must have the columns
+        ['date', 'name', 'text']. It is not copied, so should not be modified
+        afterwards.
+    max_words : int or None
+        If None (default), every word anyone used is counted exactly. If
+        given, at most this many words are counted for each person, which
+        bounds the memory used on chats with a huge vocabulary. Their counts
+        are approximate, see `SpaceSaving` for how close they are. A few
+        thousand is plenty for the top words of most chats.
+    n_jobs : int
+        The number of processes to compute the aggregates with. If more than
+        1, the messages are split into that many consecutive partitions,
+        which are aggregated in parallel and then merged. The aggregates are
+        exactly the same as with the default of 1, apart from approximate
+        word counts. If -1, uses one process per CPU. Chats too small to be
+        worth splitting are aggregated in one process regardless.
+
+    Attributes
+    ----------
+    names : list of str
+        The sorted names of everyone who sent a message.
+
+    Examples
+    --------
+    >>> from chatviz.utils import load_example_chat_data
+    >>> stats = ChatStats(load_example_chat_data())
+    >>> stats.message_counts["John Cleese"]
+    727
+    >>> stats.top_words("John Cleese", 3)
+    [('you', 275), ('the', 269), ('a', 210)]
+
+    New messages can be added later, without going through the old ones
+    again, and the aggregates can be saved in between.
+
+    >>> df = load_example_chat_data()
+    >>> stats = ChatStats(df.iloc[:2000])
+    >>> stats.update(df.iloc[2000:]).message_counts["John Cleese"]
+    727
+    """
+
+    def __init__(self, df, max_words=None, n_jobs=1):
+        self._df = df
+        self.max_words = max_words
+        self.n_jobs = n_jobs
+        self.names = sorted(df["name"].dropna().unique())
+        self._cache = {}
+
+    @property
+    def _messages(self):
+        if self._df is None:
+            raise ValueError(
+                "The messages are not kept once a ChatStats has been updated or "
+                "loaded, so only the aggregates which can be merged are available"
+            )
+        return self._df
+
+    def _aggregates(self):
+        """
+        Computes every mergeable aggregate, and returns them by key.
+        """
+        for attribute in (
+            "_hourly",
+            "word_counts",
+            "char_counts",
+            "_replies",
+            "word_counters",
+        ):
+            getattr(self, attribute)
+        return {key: self._cache[key] for key in _MERGEABLE}
+
+    def update(self, df):
+        """
+        Adds new messages to the aggregates.
+
+        Only the new messages are aggregated, which are then merged with the
+        aggregates so far, so the cost depends on the number of new messages
+        rather than the whole chat. The result is the same as aggregating all
+        of the messages together. The messages themselves are not kept, so
+        afterwards `message_lengths` and timelines with bins that are not
+        whole hours are no longer available. The reply times are summed for
+        each person, as by `from_chunks`, so that they don't grow with the
+        chat either, and only `reply_times` is kept of them, not
+        `reply_time_quantiles` or `reply_distribution`.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The new messages, in time order and all sent after the ones
+            already counted. Must have the columns ['date', 'name', 'text'].
+
+        Returns
+        -------
+        ChatStats
+            self, updated in place.
+        """
+        new = ChatStats(df, self.max_words, self.n_jobs)._aggregates()
+        self._cache = _merge_aggregates(self._aggregates(), new)
+        self._cache["replies"] = _compact_replies(self._cache["replies"])
+        self._df = None
+        self.names = sorted(set(self.names).union(new["hourly"].columns))
+        return self
+
+    @classmethod
+    def from_chunks(cls, chunks, max_words=None):
+        """
+        Aggregates a chat a chunk of messages at a time, for chats too big
+        to hold in memory.
+
+        Each chunk is reduced to its mergeable aggregates, which are merged
+        into those of the chunks before it, and then dropped. So the memory
+        used depends on the size of a chunk and of the aggregates, rather
+        than the whole chat. The aggregates grow with the number of hours
+        the chat spans, and with its vocabulary unless max_words is given.
+
+        The reply times are summed for each person as they are merged, so
+        only `reply_times` is kept, not `reply_time_quantiles` or
+        `reply_distribution`. Otherwise the aggregates are the same as those
+        of the whole chat, without its messages, as after `update`.
+
+        Parameters
+        ----------
+        chunks : iterable of pd.DataFrame
+            The messages, in time order, with the columns
+            ['date', 'name', 'text']. For example the iterator returned by
+            `prep_whatsapp_data`, `prep_sms_data` or `prep_csv_data` with a
+            chunksize, or by `ChatCache.load` with one.
+        max_words : int or None
+            As for ChatStats. If given, the memory used by the word counts
+            is bounded too.
+
+        Returns
+        -------
+        ChatStats
+            The aggregates, without the messages they came from.
+
+        Examples
+        --------
+        >>> from chatviz.load_data import prep_whatsapp_data
+        >>> chunks = prep_whatsapp_data("tests/test_data/wa_data.txt", chunksize=2)
+        >>> ChatStats.from_chunks(chunks).message_counts.tolist()
+        [2, 3]
+        """
+        aggregates = None
+        for df in chunks:
+            new = _aggregate(df, max_words)
+            if aggregates is not None:
+                new = _merge_aggregates(aggregates, new)
+            new["replies"] = _compact_replies(new["replies"])
+            aggregates = new
+        if aggregates is None:
+            empty = pd.DataFrame(
+                {
+                    "date": pd.Series([], dtype="datetime64[ns]"),
+                    "name": pd.Series([], dtype=object),
+                    "text": pd.Series([], dtype=object),
+                }
+            )
+            aggregates = _aggregate(empty, max_words)
+            aggregates["replies"] = _compact_replies(aggregates["replies"])
+        stats = cls.__new__(cls)
+        stats._df = None
+        stats.max_words = max_words
+        stats.n_jobs = 1
+        stats.names = list(aggregates["hourly"].columns)
+        stats._cache = aggregates
+        return stats
+
+    def save(self, filename):
+        """
+        Saves the mergeable aggregates, so that they can be loaded again with
+        `ChatStats.load` and updated with new messages.
+
+        The reply times are saved summed for each person, as `update` keeps
+        them, so the saved state only grows with the number of hours the
+        chat spans. So the loaded aggregates only have the mean
+        `reply_times`, not `reply_time_quantiles` or `reply_distribution`.
+
+        Parameters
+        ----------
+        filename : str or PathLike
+            The file to save to, in NumPy's .npz format.
+        """
+        aggregates = self._aggregates()
+        hourly = aggregates["hourly"]
+        replies = _compact_replies(aggregates["replies"])
+        reply_codes, reply_names = pd.factorize(replies["replies"]["name"])
+        state = {
+            "version": _STATE_VERSION,
+            "max_words": self.max_words,
+            "names": self.names,
+            "hourly_names": list(hourly.columns),
+            "words": aggregates["words"].to_dict(),
+            "chars": aggregates["chars"].to_dict(),
+            "reply_names": list(reply_names),
+            "first": _json_boundary(replies["first"]),
+            "last": _json_boundary(replies["last"]),
+            "word_counters": {
+                name: _json_counter(counter)
+                for name, counter in aggregates["word_counters"].items()
+            },
+        }
+        arrays = {
+            "state": np.frombuffer(json.dumps(state).encode(), dtype=np.uint8),
+            "hourly_dates": hourly.index.to_numpy("datetime64[ns]").view(np.int64),
+            "hourly_counts": hourly.to_numpy(np.int64),
+            "reply_codes": reply_codes.astype(np.int32),
+            "reply_ns": replies["replies"]["reply_ns"].to_numpy(),
+            "reply_counts": replies["replies"]["count"].to_numpy(np.int64),
+        }
+        with open(filename, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads aggregates saved by `ChatStats.save`.
+
+        Parameters
+        ----------
+        filename : str or PathLike
+            The file the aggregates were saved to.
+
+        Returns
+        -------
+        ChatStats
+            The aggregates, without the messages they came from, as after
+            `update`.
+        """
+        with np.load(filename, allow_pickle=False) as data:
+            state = json.loads(data["state"].tobytes())
+            if state["version"] != _STATE_VERSION:
+                raise ValueError(
+                    "{} was saved by an incompatible version of chatviz".format(
+                        filename
+                    )
+                )
+            hourly = pd.DataFrame(
+                data["hourly_counts"],
+                index=pd.DatetimeIndex(
+                    data["hourly_dates"].view("datetime64[ns]"), name="label"
+                ),
+                columns=pd.Index(state["hourly_names"], dtype=object, name="name"),
+            )
+            reply_names = np.append(np.array(state["reply_names"], dtype=object), None)
+            replies = pd.DataFrame(
+                {
+                    "name": reply_names[data["reply_codes"]],
+                    "reply_ns": data["reply_ns"],
+                }
+            )
+            if "reply_counts" in data:
+                replies["count"] = data["reply_counts"]
+        stats = cls.__new__(cls)
+        stats._df = None
+        stats.max_words = state["max_words"]
+        stats.n_jobs = 1
+        stats.names = state["names"]
+        stats._cache = {
+            "hourly": hourly,
+            "words": _series_from_json(state["words"]),
+            "chars": _series_from_json(state["chars"]),
+            "replies": {
+                "replies": replies,
+                "first": _boundary_from_json(state["first"]),
+                "last": _boundary_from_json(state["last"]),
+            },
+            "word_counters": {
+                name: _counter_from_json(counter, state["max_words"])
+                for name, counter in state["word_counters"].items()
+            },
+        }
+        return stats
+
+    def _get(self, key, compute):
+        if key not in self._cache:
+            if key in _MERGEABLE and self._n_partitions() > 1:
+                self._cache.update(self._aggregate_partitions())
+            else:
+                self._cache[key] = compute()
+        return self._cache[key]
+
+    def _n_partitions(self):
+        n_jobs = (os.cpu_count() or 1) if self.n_jobs == -1 else self.n_jobs
+        return max(1, min(n_jobs, len(self._messages) // _PARTITION_MIN_SIZE))
+
+    def _aggregate_partitions(self):
+        n_partitions = self._n_partitions()
+        bounds = np.linspace(0, len(self._messages), n_partitions + 1).astype(int)
+        partitions = [
+            self._messages.iloc[start:stop]
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        with ProcessPoolExecutor(n_partitions) as executor:
+            aggregates = executor.map(
+                _aggregate, partitions, itertools.repeat(self.max_words)
+            )
+            return functools.reduce(_merge_aggregates, aggregates)
+
+    @property
+    def _hourly(self):
+        # the base counts which all of the other message counts roll up from
+        return self._get(
+            "hourly",
+            lambda: _count_table(self._messages, self._messages["date"].dt.floor("H")),
+        )
+
+    @property
+    def message_counts(self):
+        """
+        pd.Series : The number of messages sent by each person.
+        """
+
+        def compute():
+            counts = self._hourly.sum()
+            counts.name = "text"
+            return counts
+
+        return self._get("messages", compute)
+
+    @property
+    def message_lengths(self):
+        """
+        pd.DataFrame : The number of words and characters in each message,
+        as the columns ['words', 'chars'], with the same index as the
+        messages. Missing text counts as 0 of each.
+        """
+
+        def compute():
+            text = self._messages["text"]
+            return pd.DataFrame(
+                {
+                    "words": _count_words(text),
+                    "chars": text.str.len().fillna(0).to_numpy(np.int64),
+                },
+                index=text.index,
+            )
+
+        return self._get("lengths", compute)
+
+    def _sum_lengths(self, column):
+        counts = (
+            self.message_lengths[column]
+            .groupby(self._messages["name"], observed=True)
+            .sum()
+        )
+        counts.index = counts.index.astype(object)
+        counts.name = "text"
+        return counts.sort_index()
+
+    @property
+    def word_counts(self):
+        """
+        pd.Series : The number of words sent by each person, where a word is
+        a run of letters and numbers.
+        """
+        return self._get("words", lambda: self._sum_lengths("words"))
+
+    @property
+    def char_counts(self):
+        """
+        pd.Series : The number of characters sent by each person.
+        """
+        return self._get("chars", lambda: self._sum_lengths("chars"))
+
+    @property
+    def _hour_weekday_cube(self):
+        def compute():
+            # one count per person, day of the week and hour of the day,
+            # rolled up from the hourly counts with a single bincount
+            hourly = self._hourly
+            n_people = len(hourly.columns)
+            cells = hourly.index.dayofweek * 24 + hourly.index.hour
+            keys = np.arange(n_people) * 7 * 24 + cells.to_numpy()[:, None]
+            counts = np.bincount(
+                keys.ravel(),
+                weights=hourly.to_numpy(np.int64).ravel(),
+                minlength=n_people * 7 * 24,
+            )
+            return counts.astype(np.int64).reshape(n_people, 7, 24)
+
+        return self._get("hour_weekday", compute)
+
+    def _label_counts(self, key, axis):
+        def compute():
+            names = pd.Index(self.message_counts.index, name="name")
+            totals = self._hour_weekday_cube.sum(axis=axis)
+            labels = pd.RangeIndex(totals.shape[1], name="label")
+            counts = pd.DataFrame(totals, index=names, columns=labels)
+            # as a groupby count of the messages would give
+            counts = counts.loc[:, (counts != 0).any()]
+            return counts.where(counts != 0)
+
+        return self._get(key, compute)
+
+    @property
+    def hour_counts(self):
+        """
+        pd.DataFrame : The number of messages sent by each person (rows) in
+        each hour of the day (columns). Hours in which nobody sent a message
+        are left out, and people who sent nothing in an hour have NaN.
+        """
+        return self._label_counts("hours", axis=1)
+
+    @property
+    def weekday_counts(self):
+        """
+        pd.DataFrame : The number of messages sent by each person (rows) on
+        each day of the week (columns), where 0 is Monday. Days on which
+        nobody sent a message are left out, and people who sent nothing on a
+        day have NaN.
+        """
+        return self._label_counts("weekdays", axis=2)
+
+    @property
+    def hour_weekday_counts(self):
+        """
+        pd.DataFrame : The number of messages sent by each person on each day
+        of the week (rows, indexed by name and weekday, where 0 is Monday)
+        in each hour of the day (columns). Every day and hour is included.
+        """
+
+        def compute():
+            cube = self._hour_weekday_cube
+            index = pd.MultiIndex.from_product(
+                [self.message_counts.index, range(7)], names=["name", "weekday"]
+            )
+            return pd.DataFrame(
+                cube.reshape(-1, 24),
+                index=index,
+                columns=pd.RangeIndex(24, name="hour"),
+            )
+
+        return self._get("hour_weekday_counts", compute)
+
+    @property
+    def _replies(self):
+        return self._get("replies", lambda: _reply_intervals(self._messages))
+
+    def _reply_list(self):
+        replies = self._replies["replies"]
+        if "count" in replies:
+            raise ValueError(
+                "Only the mean reply times are kept by ChatStats.from_chunks, "
+                "update and load"
+            )
+        return replies
+
+    def _per_replier(self, func):
+        replies = self._reply_list()
+        if replies.empty:
+            return None
+        seconds = 1e-9 * replies["reply_ns"]
+        return func(seconds.groupby(replies["name"]))
+
+    @property
+    def reply_times(self):
+        """
+        pd.Series or None : The mean time in hours each person took to reply
+        to someone else's message, or None if nobody ever replied.
+        """
+
+        def compute():
+            replies = self._replies["replies"]
+            if "count" in replies:
+                if replies.empty:
+                    return None
+                totals = replies.groupby("name")[["reply_ns", "count"]].sum()
+                hours = 1e-9 * totals["reply_ns"] / totals["count"] / 3600
+            else:
+                hours = self._per_replier(lambda g: g.mean() / 3600)
+            if hours is not None:
+                hours.name = "reply_hours"
+            return hours
+
+        return self._get("reply_times", compute)
+
+    def reply_time_quantiles(self, q=0.5):
+        """
+        Returns quantiles of the time in hours each person took to reply.
+
+        Parameters
+        ----------
+        q : float or list of float
+            The quantiles to compute, between 0 and 1. The default of 0.5
+            gives the median.
+
+        Returns
+        -------
+        pd.Series or pd.DataFrame or None
+            If q is a float, a Series of the quantile for each person,
+            otherwise a DataFrame with one row per person and one column per
+            quantile. None if nobody ever replied.
+        """
+        if np.ndim(q) == 0:
+            return self._per_replier(lambda g: g.quantile(q) / 3600)
+        return self._per_replier(lambda g: g.quantile(q).unstack() / 3600)
+
+    @property
+    def reply_distribution(self):
+        """
+        dict : Every time in hours each person took to reply, as a sorted
+        array keyed by name. People who never replied are left out.
+        """
+
+        def compute():
+            replies = self._reply_list()
+            hours = 1e-9 * replies["reply_ns"].to_numpy() / 3600
+            return {
+                name: np.sort(hours[positions])
+                for name, positions in replies.groupby(
+                    "name", observed=True
+                ).indices.items()
+            }
+
+        return self._get("reply_distribution", compute)
+
+    def timeline(self, freq="MS", total=False):
+        """
+        Counts the messages sent by each person in bins of time.
+
+        Parameters
+        ----------
+        freq : str
+            The offset string for the size of the bins. The default is 'MS',
+            which gives monthly bins.
+        total : bool
+            If True, counts all of the messages in each bin instead, including
+            those without a name, as resampling the messages would. Without
+            the messages, i.e. after `update`, only those with a name are
+            counted. Default is False.
+
+        Returns
+        -------
+        pd.DataFrame or pd.Series
+            The counts, with one row per bin from the first message to the
+            last and one column per person, or a Series of the totals.
+        """
+        if total:
+            return self._get(("timeline_total", freq), lambda: self._total(freq))
+
+        def compute():
+            if _rolls_up_from_hours(freq):
+                hourly = self._hourly
+                names = hourly.columns
+                counts = hourly.to_numpy(np.int64)
+                # every hour once for each person, weighted by their count
+                dates = np.repeat(hourly.index.asi8, len(names))
+                codes = np.tile(np.arange(len(names)), len(hourly))
+                weights = counts.ravel()
+            else:
+                messages = self._messages[self._messages["text"].notnull()]
+                codes, names = pd.factorize(messages["name"])
+                names = names.astype(object)
+                dates = messages["date"].to_numpy("datetime64[ns]").view(np.int64)
+                weights = None
+            if not len(dates):
+                index = pd.DatetimeIndex([], name="date", freq=freq)
+                columns = pd.Index(sorted(names), dtype=object, name="name")
+                return pd.DataFrame(index=index, columns=columns, dtype=np.int64)
+            labels, counts = _bin_counts(dates, codes, len(names), freq, weights)
+            order = np.argsort(np.asarray(names, dtype=object))
+            return pd.DataFrame(
+                counts[order].T,
+                index=labels.rename("date"),
+                columns=pd.Index(np.asarray(names, dtype=object)[order], name="name"),
+            )
+
+        return self._get(("timeline", freq), compute)
+
+    def _total(self, freq):
+        if self._df is None:
+            total = self.timeline(freq).sum(axis=1)
+            total.name = "text"
+            return total
+        messages = self._messages
+        dates = messages["date"].to_numpy("datetime64[ns]").view(np.int64)
+        if not len(dates):
+            index = pd.DatetimeIndex([], name="date", freq=freq)
+            return pd.Series([], index=index, dtype=np.int64, name="text")
+        # every message spans the bins, as with resample, but only those
+        # with text are counted
+        weights = messages["text"].notnull().to_numpy(np.float64)
+        codes = np.zeros(len(dates), dtype=np.int64)
+        labels, counts = _bin_counts(dates, codes, 1, freq, weights)
+        return pd.Series(counts[0], index=labels.rename("date"), name="text")
+
+    @property
+    def word_counters(self):
+        """
+        dict : A Counter of the words used by each person, keyed by name, or
+        a SpaceSaving if max_words is given. Words are lower cased, and are
+        runs of letters and underscores.
+        """
+        return self._get(
+            "word_counters", lambda: _word_counts(self._messages, self.max_words)
+        )
+
+    def top_words(self, name, n=10, stopwords=None):
+        """
+        Returns the n words most used by name, and their counts.
+
+        Parameters
+        ----------
+        name : str
+            The person to get the words of.
+        n : int
+            The number of words to return. Default is 10.
+        stopwords : None or iterable
+            If given, then these words are left out.
+
+        Returns
+        -------
+        list of (str, int)
+            The words and their counts, most used first.
+        """
+        stopwords = _stopword_set(tuple(stopwords or ()))
+        counts = self.word_counters.get(name, Counter())
+        return heapq.nlargest(
+            n,
+            ((w, c) for w, c in counts.items() if w not in stopwords),
+            key=itemgetter(1),
+        )
+
+
+# bump whenever the format written by ChatStats.save changes
+_STATE_VERSION = 1
+# the aggregates which are computed per partition and merged
+_MERGEABLE = ("hourly", "words", "chars", "replies", "word_counters")
+# chats are only split into partitions of at least this many messages
+_PARTITION_MIN_SIZE = 100000
+
+
+def _aggregate(df, max_words=None):
+    """
+    Computes the mergeable aggregates of a partition of the messages.
+    """
+    return ChatStats(df, max_words)._aggregates()
+
+
+def _json_boundary(boundary):
+    return None if boundary is None else [boundary[0], int(boundary[1])]
+
+
+def _boundary_from_json(boundary):
+    return None if boundary is None else (boundary[0], np.int64(boundary[1]))
+
+
+def _series_from_json(counts):
+    series = pd.Series(counts, name="text", dtype=np.int64)
+    series.index = pd.Index(series.index, dtype=object, name="name")
+    return series
+
+
+def _json_counter(counter):
+    if isinstance(counter, SpaceSaving):
+        return {
+            "total": counter.total,
+            "words": [[w, c, counter._errors[w]] for w, c in counter.items()],
+        }
+    return {"words": list(counter.items())}
+
+
+def _counter_from_json(counter, max_words):
+    if max_words is None:
+        return Counter(dict(counter["words"]))
+    words = SpaceSaving(max_words)
+    words.total = counter["total"]
+    words._counts = {w: c for w, c, _ in counter["words"]}
+    words._errors = {w: e for w, _, e in counter["words"]}
+    words._heap = [(c, w) for w, c, _ in counter["words"]]
+    heapq.heapify(words._heap)
+    return words
+
+
+def _merge_word_counters(a, b):
+    """
+    Merges the word counters of two partitions into new counters, leaving
+    those of a and b as they were, as they may be cached.
+    """
+    merged = dict(a)
+    for name, counter in b.items():
+        if name not in merged:
+            merged[name] = counter
+            continue
+        # merge only replaces the dicts of a SpaceSaving, so a shallow copy
+        # is enough for either kind of counter
+        merged[name] = copy.copy(merged[name])
+        if isinstance(counter, SpaceSaving):
+            merged[name].merge(counter)
+        else:
+            merged[name].update(counter)
+    return dict(sorted(merged.items()))
+
+
+def _merge_aggregates(a, b):
+    """
+    Merges the aggregates of two consecutive partitions of the messages.
+    """
+    return {
+        "hourly": _add_counts(a["hourly"], b["hourly"]),
+        "words": _add_counts(a["words"], b["words"]),
+        "chars": _add_counts(a["chars"], b["chars"]),
+        "replies": _merge_replies(a["replies"], b["replies"]),
+        "word_counters": _merge_word_counters(a["word_counters"], b["word_counters"]),
+    }
+
+
+def _as_stats(data, **kwargs):
+    """
+    Returns data if it is already a ChatStats, or the ChatStats of a Chat,
+    otherwise wraps the DataFrame of messages in one, passing on kwargs.
+    """
+    from chatviz.chat import Chat
+
+    if isinstance(data, ChatStats):
+        return data
+    if isinstance(data, Chat):
+        return data.stats
+    return ChatStats(data, **kwargs)
@@ -1,6 +1,7 @@
 import pathlib
 
-import pandas as pd
+from chatviz.load_data import prep_csv_data
+from chatviz.stats import ChatStats
 
 STOPWORDS = [
     "and",
@@ -126,15 +127,19 @@ def _build_color_dict(colors, df):
     Builds the color dict from colors.
 
     If already a dict then just returns that, otherwise will create a dict
-    by zipping the colors iterable and the sorted unique names in df['name'].
+    by zipping the colors iterable and the sorted unique names in df['name'],
+    where df can also be a ChatStats.
     """
     if isinstance(colors, dict):
         return colors
-    if df.index.name == "name":
-        col = df.index
+    if isinstance(df, ChatStats):
+        sorted_names = df.names
     else:
-        col = df["name"]
-    sorted_names = sorted(set(col))
+        if df.index.name == "name":
+            col = df.index
+        else:
+            col = df["name"]
+        sorted_names = sorted(set(col))
     if colors == "default":
         colors = ["C{}".format(i) for i in range(len(sorted_names))]
     elif isinstance(colors, str):
@@ -153,4 +158,4 @@ def _map_colors(colors, df):
 
 def load_example_chat_data():
     fname = pathlib.Path(__file__) / ".." / "data" / "mpfc1_example_data.csv"
-    return pd.read_csv(fname.resolve(), index_col=0, parse_dates=["date"])
+    return prep_csv_data(fname.resolve(), date_format="%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,13 @@
+from chatviz.utils import load_example_chat_data
+from chatviz.plotting import plot_hour_weekday_heatmap
+import matplotlib.pyplot as plt
+
+plt.rcParams["figure.figsize"] = [20, 8]
+plt.rcParams["font.size"] = 16
+plt.rcParams["axes.titlesize"] = 30
+plt.rcParams["font.family"] = "Sawasdee"
+
+df = load_example_chat_data()
+plot_hour_weekday_heatmap(df, cmap="YlOrRd")
+plt.tight_layout()
+plt.show()
@@ -0,0 +1,132 @@
+"""
+Test the notebook app.
+"""
+
+import os
+from types import SimpleNamespace
+
+import matplotlib.pyplot as plt
+import pytest
+
+from chatviz import app
+from chatviz.main import Dashboard
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def upload(filename):
+    with open(os.path.join(TEST_DATA, filename), "rb") as f:
+        content = f.read()
+    return SimpleNamespace(
+        value={filename: {"metadata": {"name": filename}, "content": content}}
+    )
+
+
+@pytest.fixture
+def session_state(monkeypatch):
+    """
+    Counts the parses and records the panels redrawn, without displaying.
+    """
+    state = {"parses": 0, "panels": [], "shown": []}
+    loader = app._LOADERS["WhatsApp"]
+
+    def counting_loader(f):
+        state["parses"] += 1
+        return loader(f)
+
+    draw = Dashboard.draw
+
+    def recording_draw(self, df, title, colors="default", panels=None):
+        state["panels"].append(panels)
+        return draw(self, df, title, colors, panels)
+
+    monkeypatch.setitem(app._LOADERS, "WhatsApp", counting_loader)
+    monkeypatch.setattr(Dashboard, "draw", recording_draw)
+    monkeypatch.setattr(app, "_show", state["shown"].append)
+    monkeypatch.setattr(app, "_sessions", app.OrderedDict())
+    yield state
+    for session in app._sessions.values():
+        plt.close(session.dashboard.fig)
+
+
+def test_upload_parsed_once(session_state):
+    widget = upload("wa_data.txt")
+    assert app.visualize(widget, "WhatsApp") is None
+    assert session_state["panels"] == [None]
+    fig = session_state["shown"][0]
+    assert fig._suptitle.get_text() == "Example Plot"
+
+    app.visualize(widget, "WhatsApp", title="Cheese Shop")
+    app.visualize(widget, "WhatsApp", "Cheese Shop", timeline_freq="W")
+    app.visualize(widget, "WhatsApp", "Cheese Shop", timeline_freq="W", top_n_words=3)
+    app.visualize(widget, "WhatsApp", "Cheese Shop", colors=["C2", "C3"])
+    # the same upload again, unchanged
+    app.visualize(upload("wa_data.txt"), "WhatsApp", "Cheese Shop", colors=["C2", "C3"])
+
+    assert session_state["parses"] == 1
+    assert session_state["shown"] == [fig] * 6
+    assert session_state["panels"][1:] == [
+        {"title"},
+        {"timeline"},
+        {"words"},
+        {"timeline", "words", "donuts", "legend", "hours", "days", "reply"},
+    ]
+    assert fig._suptitle.get_text() == "Cheese Shop"
+    ax = app._sessions[next(iter(app._sessions))].dashboard._axes["words"][0]
+    assert len(ax.get_yticklabels()) == 10
+
+
+def test_fewer_top_words(session_state):
+    widget = upload("wa_data.txt")
+    app.visualize(widget, "WhatsApp", top_n_words=12)
+    app.visualize(widget, "WhatsApp", top_n_words=3)
+    fig = session_state["shown"][-1]
+    dashboard = app._sessions[next(iter(app._sessions))].dashboard
+    for ax, bars in zip(dashboard._axes["words"], dashboard._words):
+        assert len(ax.get_yticklabels()) == 3
+        assert [bar.get_visible() for bar in bars] == [True] * 3 + [False] * 9
+    assert fig is dashboard.fig
+
+
+def test_new_upload_new_session(session_state, monkeypatch):
+    monkeypatch.setattr(app, "_MAX_SESSIONS", 1)
+    app.visualize(upload("wa_data.txt"), "WhatsApp")
+    app.visualize(upload("wa_data_multiline.txt"), "WhatsApp")
+    first, second = session_state["shown"]
+    assert second is not first
+    assert session_state["parses"] == 2
+    assert len(app._sessions) == 1
+
+
+def test_upload_read_from_cache(session_state, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "_MAX_SESSIONS", 1)
+    for filename in ["wa_data.txt", "wa_data_multiline.txt", "wa_data.txt"]:
+        app.visualize(upload(filename), "WhatsApp", cache_dir=tmp_path)
+    # the first upload's session was evicted, but its chat is still cached
+    assert session_state["parses"] == 2
+    first, _, third = session_state["shown"]
+    assert third is not first
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_upload_not_cached_by_default(session_state, monkeypatch, tmp_path):
+    monkeypatch.setenv("CHATVIZ_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(app, "_MAX_SESSIONS", 1)
+    for filename in ["wa_data.txt", "wa_data_multiline.txt", "wa_data.txt"]:
+        app.visualize(upload(filename), "WhatsApp")
+    assert session_state["parses"] == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_shown_once_per_call(session_state):
+    widget = upload("wa_data.txt")
+    for title in ["Cheese Shop", "Cheese Shop", "Dead Parrot"]:
+        app.visualize(widget, "WhatsApp", title)
+    assert len(session_state["shown"]) == 3
+    app.visualize(None, "WhatsApp")
+    assert len(session_state["shown"]) == 3
+
+
+def test_invalid_file_type(session_state):
+    with pytest.raises(ValueError, match="Invalid option Telegram"):
+        app.visualize(upload("wa_data.txt"), "Telegram")
@@ -0,0 +1,184 @@
+"""
+Test rendering the dashboards of a directory of chats.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+
+import pytest
+
+from chatviz import batch
+from chatviz.batch import detect_format, main, render_chats
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    # the workers are started by each test, so they see the variable
+    directory = str(tmpdir.join("cache"))
+    monkeypatch.setenv("CHATVIZ_CACHE_DIR", directory)
+    return directory
+
+
+@pytest.fixture
+def exports(tmpdir):
+    directory = tmpdir.mkdir("exports")
+    for name in ["wa_data.txt", "sms_data.xml", "fb_data.json", "series_1.csv"]:
+        shutil.copy(os.path.join(TEST_DATA, name), str(directory))
+    shutil.copytree(
+        os.path.join(TEST_DATA, "fb_thread"), str(directory.join("fb_thread"))
+    )
+    return directory
+
+
+def test_detect_format(exports, tmpdir):
+    assert detect_format(str(exports.join("wa_data.txt"))) == "whatsapp"
+    assert detect_format(str(exports.join("sms_data.xml"))) == "sms"
+    assert detect_format(str(exports.join("fb_data.json"))) == "facebook"
+    assert detect_format(str(exports.join("series_1.csv"))) == "csv"
+    assert detect_format(str(exports.join("fb_thread"))) == "facebook"
+    # without an extension, the format is sniffed from the contents
+    for name, expected in [
+        ("wa_data.txt", "whatsapp"),
+        ("sms_data.xml", "sms"),
+        ("fb_data.json", "facebook"),
+    ]:
+        copy = str(tmpdir.join(expected))
+        shutil.copy(str(exports.join(name)), copy)
+        assert detect_format(copy) == expected
+    unknown = tmpdir.join("unknown")
+    unknown.write("spam")
+    assert detect_format(str(unknown)) is None
+
+
+def test_render_chats(exports, tmpdir):
+    output = str(tmpdir.join("dashboards"))
+    options = dict(n_jobs=2, figsize=(8, 10), timeline_color="C0")
+    summary = render_chats(str(exports), output, **options)
+    assert summary["failed"] == []
+    assert summary["rendered"] == 5
+    assert summary["messages"] > 0
+    assert sorted(os.listdir(output)) == [
+        "fb_data.png",
+        "fb_thread.png",
+        "series_1.png",
+        "sms_data.png",
+        "summary.json",
+        "wa_data.png",
+    ]
+    with open(os.path.join(output, "summary.json")) as f:
+        assert json.load(f)["rendered"] == 5
+
+    # only the chats which changed are rendered again
+    summary = render_chats(str(exports), output, **options)
+    assert (summary["rendered"], summary["skipped"]) == (0, 5)
+    os.utime(str(exports.join("wa_data.txt")), None)
+    os.utime(os.path.join(output, "sms_data.png"), (0, 0))
+    summary = render_chats(str(exports), output, **options)
+    assert (summary["rendered"], summary["skipped"]) == (2, 3)
+
+
+def test_render_chats_same_names(tmpdir):
+    exports = tmpdir.mkdir("exports")
+    shutil.copy(os.path.join(TEST_DATA, "wa_data.txt"), str(exports.join("family.txt")))
+    shutil.copy(
+        os.path.join(TEST_DATA, "series_1.csv"), str(exports.join("family.csv"))
+    )
+    output = str(tmpdir.join("dashboards"))
+    options = dict(n_jobs=2, figsize=(8, 10), timeline_color="C0")
+    summary = render_chats(str(exports), output, **options)
+    assert summary["rendered"] == 2
+    assert sorted(os.listdir(output)) == [
+        "family.csv.png",
+        "family.txt.png",
+        "summary.json",
+    ]
+    summary = render_chats(str(exports), output, **options)
+    assert (summary["rendered"], summary["skipped"]) == (0, 2)
+
+
+def test_render_chats_chunksize(exports, tmpdir):
+    options = dict(n_jobs=1, figsize=(8, 10), timeline_color="C0")
+    whole = render_chats(str(exports), str(tmpdir.join("whole")), **options)
+    chunked = render_chats(
+        str(exports), str(tmpdir.join("chunked")), chunksize=2, **options
+    )
+    assert chunked["failed"] == []
+    assert chunked["rendered"] == 5
+    assert chunked["messages"] == whole["messages"]
+
+
+def test_render_chats_failures(exports, tmpdir):
+    exports.join("broken.txt").write("not a chat\n")
+    output = str(tmpdir.join("dashboards"))
+    summary = render_chats(
+        str(exports), output, n_jobs=1, timeout=1e-3, figsize=(8, 10)
+    )
+    assert summary["rendered"] == 0
+    assert len(summary["failed"]) == 6
+    assert all("Error" in f["error"] for f in summary["failed"])
+    assert os.listdir(output) == ["summary.json"]
+
+
+def _killed(filename, **kwargs):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the workers only see the patched loader if they are forked",
+)
+def test_render_chats_killed_worker(exports, tmpdir, monkeypatch):
+    monkeypatch.setitem(batch.LOADERS, "whatsapp", _killed)
+    output = str(tmpdir.join("dashboards"))
+    # with other chats in flight when the worker dies
+    summary = render_chats(str(exports), output, n_jobs=2, timeline_color="C0")
+    assert summary["rendered"] == 4
+    failed = [failure["chat"] for failure in summary["failed"]]
+    assert failed == [str(exports.join("wa_data.txt"))]
+    assert "BrokenProcessPool" in summary["failed"][0]["error"]
+    with open(os.path.join(output, "summary.json")) as f:
+        assert len(json.load(f)["chats"]) == 5
+
+
+def _not_parsed(filename, **kwargs):
+    raise AssertionError("parsed again")
+
+
+# as the cache keys chats by the loader's name
+_not_parsed.__module__ = batch.prep_whatsapp_data.__module__
+_not_parsed.__qualname__ = batch.prep_whatsapp_data.__qualname__
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the workers only see the patched loader if they are forked",
+)
+def test_render_chats_cached(exports, tmpdir, cache_dir, monkeypatch):
+    options = dict(n_jobs=1, figsize=(8, 10), timeline_color="C0", force=True)
+    render_chats(str(exports), str(tmpdir.join("first")), **options)
+    assert len(os.listdir(cache_dir)) == 5
+    # unchanged exports are read back from the cache rather than parsed
+    monkeypatch.setitem(batch.LOADERS, "whatsapp", _not_parsed)
+    summary = render_chats(str(exports), str(tmpdir.join("second")), **options)
+    assert summary["failed"] == []
+    summary = render_chats(
+        str(exports), str(tmpdir.join("second")), cache=False, **options
+    )
+    assert [failure["format"] for failure in summary["failed"]] == ["whatsapp"]
+    # and changed ones are parsed again
+    os.utime(str(exports.join("wa_data.txt")), (0, 0))
+    summary = render_chats(str(exports), str(tmpdir.join("third")), **options)
+    assert [failure["format"] for failure in summary["failed"]] == ["whatsapp"]
+
+
+def test_main(exports, tmpdir, capsys):
+    output = str(tmpdir.join("dashboards"))
+    argv = [str(exports), output, "--format", "svg", "--jobs", "1", "--size", "8", "10"]
+    assert main(argv) == 0
+    assert "rendered 5, skipped 0, failed 0" in capsys.readouterr().out
+    assert os.path.exists(os.path.join(output, "wa_data.svg"))
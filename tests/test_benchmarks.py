@@ -0,0 +1,69 @@
+"""
+Test the synthetic chats and the regression checks of the benchmark suite.
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks import suite
+from benchmarks.synthetic import EXTENSIONS, generate_chat, iter_chat, write_chat
+from chatviz.batch import LOADERS
+
+
+def test_generate_chat_is_deterministic():
+    df = generate_chat(1000, n_people=3, span="30D", vocabulary=50, seed=1)
+    pd.testing.assert_frame_equal(
+        df, generate_chat(1000, n_people=3, span="30D", vocabulary=50, seed=1)
+    )
+    assert len(df) == 1000
+    assert sorted(df["name"].unique()) == ["Person 0", "Person 1", "Person 2"]
+    assert df["date"].is_monotonic_increasing
+    span = df["date"].iloc[-1] - df["date"].iloc[0]
+    assert pd.Timedelta("25D") < span < pd.Timedelta("35D")
+    assert len(set(" ".join(df["text"]).split())) <= 50
+    assert not generate_chat(1000, seed=2)["text"].equals(df["text"])
+
+
+def test_iter_chat_chunks(monkeypatch):
+    monkeypatch.setattr("benchmarks.synthetic._CHUNKSIZE", 300)
+    chunks = list(iter_chat(1000))
+    assert [len(c) for c in chunks] == [300, 300, 300, 100]
+    dates = pd.concat(chunks)["date"]
+    assert dates.is_monotonic_increasing
+
+
+@pytest.mark.parametrize("chat_format", sorted(EXTENSIONS))
+def test_write_chat(chat_format, tmpdir):
+    path = str(tmpdir.join("chat" + EXTENSIONS[chat_format]))
+    write_chat(chat_format, path, 500, n_people=4)
+    df = LOADERS[chat_format](path)
+    expected = generate_chat(500, n_people=4)
+    assert df["name"].astype(object).tolist() == expected["name"].tolist()
+    assert df["text"].astype(object).tolist() == expected["text"].tolist()
+    # whatsapp dates are to the minute and csv ones to the second
+    error = expected["date"].to_numpy() - df["date"].to_numpy()
+    assert pd.Timedelta(0) <= error.min() and error.max() < pd.Timedelta(minutes=1)
+
+
+def test_compare():
+    baselines = {
+        "load_csv@10000": {"seconds": 1.0, "peak_mb": 100.0},
+        "plot_words@10000": {"seconds": 0.01, "peak_mb": 1.0},
+    }
+    results = {
+        "load_csv@10000": {"seconds": 1.4, "peak_mb": 130.0},
+        # within the absolute noise, however large relatively
+        "plot_words@10000": {"seconds": 0.025, "peak_mb": 2.5},
+        "visualize_chat@10000": {"seconds": 100.0, "peak_mb": 100.0},
+    }
+    regressions = suite.compare(results, baselines)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("load_csv@10000 peak_mb")
+    assert suite.compare(results, baselines, memory_tolerance=0.5) == []
+
+
+def test_run_case(tmpdir):
+    suite._write_chats(str(tmpdir), 1000)
+    result = suite.run_case("load_sms", str(tmpdir), 1000, repeat=1)
+    assert result["seconds"] > 0
+    assert result["peak_mb"] >= 0
@@ -0,0 +1,146 @@
+"""
+Test the on-disk cache of parsed chats.
+"""
+
+import os
+import pathlib
+import time
+
+import pandas as pd
+
+from chatviz.cache import ChatCache
+from chatviz.load_data import prep_facebook_data, prep_whatsapp_data
+
+TEST_DATA = (pathlib.Path(__file__) / ".." / "test_data").resolve()
+
+
+class CountingLoader:
+    def __init__(self, loader):
+        self.loader = loader
+        self.calls = 0
+        self.__module__ = loader.__module__
+        self.__qualname__ = loader.__qualname__
+
+    def __call__(self, filename, **kwargs):
+        self.calls += 1
+        return self.loader(filename, **kwargs)
+
+
+def test_repeat_loads_skip_parsing(tmp_path):
+    cache = ChatCache(tmp_path)
+    loader = CountingLoader(prep_whatsapp_data)
+    expected_df = prep_whatsapp_data(TEST_DATA / "wa_data_multiline.txt")
+    for _ in range(3):
+        df = cache.load(loader, TEST_DATA / "wa_data_multiline.txt")
+        pd.testing.assert_frame_equal(expected_df, df)
+    assert loader.calls == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_missing_values_round_trip(tmp_path):
+    cache = ChatCache(tmp_path)
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]),
+            "name": ["Owner", None, "Customer"],
+            "text": ["Cheddar? \U0001f9c0", None, ""],
+        }
+    )
+    cache._write(df, os.path.join(tmp_path, "entry"))
+    cached = cache._read(os.path.join(tmp_path, "entry"))
+    assert cached["text"].isnull().tolist() == [False, True, False]
+    assert cached["text"].fillna("").tolist() == ["Cheddar? \U0001f9c0", "", ""]
+    assert cached["name"].isnull().tolist() == [False, True, False]
+    pd.testing.assert_series_equal(df["date"], cached["date"])
+
+
+def test_lone_surrogates_round_trip(tmp_path):
+    cache = ChatCache(tmp_path)
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2020-01-01", "2020-01-02"]),
+            "name": ["Owner", "Customer"],
+            "text": ["Camembert \ud83d", "Runny"],
+        }
+    )
+    cache._write(df, os.path.join(tmp_path, "entry"))
+    cached = cache._read(os.path.join(tmp_path, "entry"))
+    assert cached["text"].tolist() == df["text"].tolist()
+
+
+def test_key_depends_on_contents_and_loader(tmp_path):
+    cache = ChatCache(tmp_path)
+    chat = tmp_path / "chat.txt"
+    chat.write_text((TEST_DATA / "wa_data.txt").read_text())
+    key = cache.key(prep_whatsapp_data, chat)
+    assert key == cache.key(prep_whatsapp_data, chat)
+    assert key != cache.key(prep_facebook_data, chat)
+    with open(chat, "a") as f:
+        f.write("\n01/01/1970, 00:03 - Customer: Cheese!")
+    assert key != cache.key(prep_whatsapp_data, chat)
+    fb_dir = TEST_DATA / "fb_thread"
+    assert cache.key(prep_facebook_data, fb_dir) == cache.key(
+        prep_facebook_data, fb_dir / "message_*.json"
+    )
+
+
+def test_key_by_modification_time(tmp_path):
+    cache = ChatCache(tmp_path, hash_contents=False)
+    chat = tmp_path / "chat.txt"
+    chat.write_text((TEST_DATA / "wa_data.txt").read_text())
+    copy = tmp_path / "copy.txt"
+    copy.write_text(chat.read_text())
+    key = cache.key(prep_whatsapp_data, chat)
+    assert key == cache.key(prep_whatsapp_data, chat)
+    assert key != cache.key(prep_whatsapp_data, copy)
+    os.utime(chat, ns=(0, 0))
+    assert key != cache.key(prep_whatsapp_data, chat)
+
+
+def test_eviction(tmp_path):
+    cache = ChatCache(tmp_path, max_bytes=None)
+    cache.load(prep_whatsapp_data, TEST_DATA / "wa_data.txt")
+    cache.load(prep_facebook_data, TEST_DATA / "fb_data.json")
+    first, second = sorted(os.scandir(tmp_path), key=lambda e: e.stat().st_mtime)
+    os.utime(first.path, (time.time() - 100, time.time() - 100))
+
+    ChatCache(tmp_path, max_age=1000).evict()
+    assert len(os.listdir(tmp_path)) == 2
+    ChatCache(tmp_path, max_age=10).evict()
+    assert os.listdir(tmp_path) == [second.name]
+
+    cache.load(prep_whatsapp_data, TEST_DATA / "wa_data.txt")
+    ChatCache(tmp_path, max_bytes=1).evict()
+    assert os.listdir(tmp_path) == []
+
+
+def test_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHATVIZ_CACHE", "0")
+    cache = ChatCache(tmp_path / "cache")
+    loader = CountingLoader(prep_whatsapp_data)
+    cache.load(loader, TEST_DATA / "wa_data.txt")
+    cache.load(loader, TEST_DATA / "wa_data.txt")
+    assert loader.calls == 2
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_chunked_loads(tmp_path):
+    cache = ChatCache(tmp_path)
+    loader = CountingLoader(prep_whatsapp_data)
+    filename = TEST_DATA / "wa_data_multiline.txt"
+    expected_df = prep_whatsapp_data(filename)
+
+    # a chunked load that is stopped early isn't cached
+    next(iter(cache.load(loader, filename, chunksize=2)))
+    assert os.listdir(tmp_path) == []
+
+    for _ in range(2):
+        chunks = list(cache.load(loader, filename, chunksize=2))
+        assert all(len(df) <= 2 for df in chunks)
+        # each chunk can't know every name, so they aren't categorical
+        df = pd.concat(chunks, ignore_index=True).astype({"name": "category"})
+        pd.testing.assert_frame_equal(expected_df, df)
+    assert loader.calls == 2
+    # whole and chunked loads share the cached chat
+    pd.testing.assert_frame_equal(expected_df, cache.load(loader, filename))
+    assert loader.calls == 2
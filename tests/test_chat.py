@@ -0,0 +1,137 @@
+"""
+Test the windows of a Chat.
+"""
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import pytest
+
+from chatviz import Chat, ChatStats
+from chatviz import chat as chat_module
+from chatviz.plotting import plot_donuts, plot_timeline
+from chatviz.utils import load_example_chat_data
+
+
+def assert_same_stats(stats, expected):
+    pd.testing.assert_frame_equal(stats._hourly, expected._hourly)
+    pd.testing.assert_series_equal(stats.word_counts, expected.word_counts)
+    pd.testing.assert_series_equal(stats.char_counts, expected.char_counts)
+    pd.testing.assert_series_equal(stats.reply_times, expected.reply_times)
+    assert stats.word_counters == expected.word_counters
+
+
+def test_between():
+    df = load_example_chat_data()
+    chat = Chat(df)
+    window = chat.between("1970-10-10", "1970-12-20 12:00")
+    mask = (df["date"] >= "1970-10-10") & (df["date"] < "1970-12-20 12:00")
+    assert len(window) == mask.sum()
+    pd.testing.assert_frame_equal(
+        window.frame.reset_index(drop=True), df[mask].reset_index(drop=True)
+    )
+    # a view of the messages, not a copy
+    assert window.frame["date"].values.base is chat.frame["date"].values.base
+    assert len(chat.between(end="1970-10-10")) == (df["date"] < "1970-10-10").sum()
+    assert len(window.between("1971-01-01")) == 0
+    assert len(chat.between("1971-01-01", "1970-01-01")) == 0
+
+
+def test_by():
+    df = load_example_chat_data()
+    chat = Chat(df.sample(frac=1, random_state=0))
+    people = chat.by(["John Cleese", "Eric Idle", "Brian"])
+    assert people.names == ["Eric Idle", "John Cleese"]
+    expected = df[df["name"].isin(people.names)].reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        people.frame.reset_index(drop=True), expected, check_categorical=False
+    )
+    assert people.by("John Cleese").names == ["John Cleese"]
+    assert people.by("Terry Jones").names == []
+    assert len(people.by("Terry Jones")) == 0
+
+
+@pytest.mark.parametrize("names", [None, ["John Cleese", "Eric Idle"]])
+def test_stats_merged_from_blocks(monkeypatch, names):
+    monkeypatch.setattr(chat_module, "_BLOCK_SIZE", 100)
+    chat = Chat(load_example_chat_data())
+    if names is not None:
+        chat = chat.by(names)
+    window = chat.between("1970-10-10", "1970-12-20")
+    assert_same_stats(window.stats, ChatStats(window.frame))
+    n_blocks = len(chat._index.blocks)
+    assert n_blocks > 0
+    # an overlapping window only aggregates the blocks it doesn't share
+    overlapping = chat.between("1970-10-20", "1970-12-30")
+    assert_same_stats(overlapping.stats, ChatStats(overlapping.frame))
+    assert len(chat._index.blocks) < 2 * n_blocks
+    assert window.stats is chat.between("1970-10-10", "1970-12-20").stats
+
+
+def test_blocks_evicted(monkeypatch):
+    monkeypatch.setattr(chat_module, "_BLOCK_SIZE", 100)
+    monkeypatch.setattr(chat_module, "_MAX_BLOCKS", 3)
+    chat = Chat(load_example_chat_data())
+    window = chat.between("1970-10-10", "1970-12-20")
+    assert_same_stats(window.stats, ChatStats(window.frame))
+    assert len(chat._index.blocks) == 3
+
+
+def test_repeated_windows_leave_blocks_alone(monkeypatch):
+    monkeypatch.setattr(chat_module, "_BLOCK_SIZE", 100)
+    chat = Chat(load_example_chat_data())
+    dates = chat.frame["date"].iloc[[0, 100, 300, 1000]].tolist()
+    windows = [
+        chat,
+        chat.between(dates[0], dates[1]),
+        chat.between(dates[0], dates[2]),
+        chat.between(dates[1], dates[3]),
+        chat.between(dates[0], dates[1]).by(["John Cleese", "Eric Idle"]),
+    ]
+    # each window merges the aggregates of blocks cached by the ones before
+    for _ in range(2):
+        for window in windows:
+            expected = ChatStats(window.frame.copy())
+            assert window.stats.word_counters == expected.word_counters
+            window._index.windows.clear()
+
+
+def test_plots_accept_chat():
+    chat = Chat(load_example_chat_data()).by("John Cleese")
+    ax = plot_donuts(chat)[0]
+    assert ax.get_title() == "Number of messages\nTotal: 727"
+    ax = plot_timeline(chat.between("1970-11-01", "1970-12-01"))
+    assert sum(p.get_height() for p in ax.patches) == len(
+        chat.between("1970-11-01", "1970-12-01")
+    )
+    plt.close("all")
+
+
+@pytest.mark.parametrize("names", [None, ["John Cleese", "Eric Idle"]])
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (None, None),
+        ("1970-10-10 10:30", "1970-12-20 12:17"),
+        ("1970-10-22 05:00", "1970-10-22 13:30"),
+        ("1970-10-22 05:10", "1970-10-22 05:40"),
+    ],
+)
+def test_counts_from_running_totals(names, start, end):
+    chat = Chat(load_example_chat_data())
+    if names is not None:
+        chat = chat.by(names)
+    window = chat.between(start, end)
+    stats, expected = window.stats, ChatStats(window.frame)
+    assert stats.names == expected.names
+    pd.testing.assert_series_equal(stats.message_counts, expected.message_counts)
+    pd.testing.assert_series_equal(stats.word_counts, expected.word_counts)
+    pd.testing.assert_series_equal(stats.char_counts, expected.char_counts)
+    pd.testing.assert_frame_equal(stats.hour_counts, expected.hour_counts)
+    pd.testing.assert_frame_equal(stats.weekday_counts, expected.weekday_counts)
+    for freq in ["MS", "W", "D", "2D", "12H", "SM"]:
+        pd.testing.assert_frame_equal(
+            stats.timeline(freq), expected.timeline(freq), check_freq=False
+        )
+    # none of which needed the messages to be aggregated
+    assert not chat._index.blocks
+    pd.testing.assert_frame_equal(stats.timeline("30min"), expected.timeline("30min"))
@@ -1,4 +1,4 @@
-from chatviz import visualize_chat
+from chatviz import ChatStats, Dashboard, visualize_chat
 from datetime import timedelta
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -91,5 +91,70 @@ def test_one_member():
     )
 
 
+def load_series_1(actors):
+    file_path = pathlib.Path(__file__) / ".." / "test_data" / "series_1.csv"
+    df = pd.read_csv(file_path.resolve(), index_col=0, parse_dates=["date"])
+    return df[df["name"].isin(actors)]
+
+
+def test_dashboard_redraws_in_place():
+    actors = ["John Cleese", "Eric Idle"]
+    df = load_series_1(actors)
+    dashboard = Dashboard(2, stopwords=STOPWORDS, timeline_freq="W")
+    fig = dashboard.draw(df, "All")
+    axes = list(fig.axes)
+    n_bars = len(dashboard._axes["timeline"].patches)
+    first_week = df[df["date"] < df["date"].min() + timedelta(days=7)]
+    assert dashboard.draw(first_week, "First week") is fig
+    # the timeline has fewer bars to show, but the rest are only hidden
+    assert fig.axes == axes
+    assert len(dashboard._axes["timeline"].patches) == n_bars
+    assert fig._suptitle.get_text() == "First week"
+
+    stats = ChatStats(first_week)
+    ax = dashboard._axes["donuts"][0]
+    assert ax.get_title() == "Number of messages\nTotal: {}".format(
+        stats.message_counts.sum()
+    )
+    labels = sorted(int(t.get_text()) for t in ax.texts if t.get_text())
+    assert labels == sorted(stats.message_counts.tolist())
+    wedges = sorted(ax.patches, key=lambda w: w.theta1)
+    assert wedges[-1].theta2 == pytest.approx(360 + 90)
+
+    timeline = dashboard._axes["timeline"]
+    visible = [p for p in timeline.patches if p.get_visible()]
+    assert [p.get_height() for p in visible] == stats.timeline("W").sum(1).tolist()
+
+    for name, ax in zip(sorted(actors), dashboard._axes["words"]):
+        top_words = stats.top_words(name, 10, STOPWORDS)
+        labels = [t.get_text() for t in ax.get_yticklabels()][::-1]
+        assert labels[: len(top_words)] == [w for w, _ in top_words]
+
+    lines = dashboard._axes["days"].get_lines()
+    counts = stats.weekday_counts.reindex(columns=range(7)).fillna(0)
+    for line, name in zip(lines, sorted(actors)):
+        assert line.get_ydata()[:-1].tolist() == counts.loc[name].tolist()
+    plt.close(fig)
+
+
+def test_dashboard_dense_timeline():
+    df = load_series_1(["John Cleese", "Eric Idle"])
+    dashboard = Dashboard(2, timeline_freq="H", timeline_stacked=True)
+    dashboard.draw(df, "Hourly")
+    timeline = dashboard._axes["timeline"]
+    assert not [p for p in timeline.patches if p.get_visible()][2:]
+    top = dashboard._timeline_steps[-1].get_data()
+    assert top.values.sum() == df["text"].count()
+    plt.close(dashboard.fig)
+
+
+def test_dashboard_wrong_number_of_people():
+    df = load_series_1(["John Cleese", "Eric Idle"])
+    dashboard = Dashboard(3)
+    with pytest.raises(ValueError, match="laid out for 3 people"):
+        dashboard.draw(df, "Two people")
+    plt.close(dashboard.fig)
+
+
 if __name__ == "__main__":
     test_two_members()
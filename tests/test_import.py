@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import pytest
+
+# the most time the chatviz modules themselves may take to import, not
+# counting numpy and pandas
+MAX_IMPORT_SECONDS = 0.1
+
+
+def import_times(statement):
+    """
+    Runs statement in a new interpreter, returning the seconds spent
+    importing each module, not counting the modules it imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if self_us.strip().isdigit():
+            times[name.strip()] = int(self_us) / 1e6
+    return times
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "import chatviz",
+        "from chatviz import ChatStats",
+        "from chatviz.load_data import prep_whatsapp_data",
+        "import chatviz.cache",
+        "import chatviz.batch",
+    ],
+)
+def test_no_matplotlib(statement):
+    times = import_times(statement)
+    assert not [m for m in times if m.split(".")[0] == "matplotlib"]
+
+
+def test_plotting_imported_on_use():
+    times = import_times("from chatviz import visualize_chat")
+    assert "matplotlib.pyplot" in times
+    assert "chatviz.plotting" in times
+
+
+def test_import_time():
+    times = import_times("import chatviz.stats, chatviz.load_data, chatviz.batch")
+    own = sum(t for m, t in times.items() if m.split(".")[0] == "chatviz")
+    assert own < MAX_IMPORT_SECONDS
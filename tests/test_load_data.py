@@ -3,9 +3,22 @@ Test the functions used for loading data from sources like Facebook, WhatsApp,
 SMS.
 """
 
-from chatviz.load_data import prep_facebook_data, prep_whatsapp_data, prep_sms_data
+from chatviz import load_data
+from chatviz.load_data import (
+    _DATE_FORMAT_CACHE,
+    _infer_date_format,
+    _iter_whatsapp_frames,
+    _sniff_date_format,
+    _to_datetime,
+    normalize_chat_data,
+    prep_csv_data,
+    prep_facebook_data,
+    prep_whatsapp_data,
+    prep_sms_data,
+)
 import pathlib
 import pandas as pd
+import pytest
 
 
 def test_prep_facebook_data():
@@ -32,7 +45,7 @@ def test_prep_facebook_data():
         columns=["date", "name", "text"],
     )
     expected_df["date"] = pd.to_datetime(expected_df["date"])
-    assert expected_df.equals(df)
+    assert normalize_chat_data(expected_df).equals(df)
 
 
 def test_prep_whatsapp_data():
@@ -49,7 +62,7 @@ def test_prep_whatsapp_data():
         columns=["date", "name", "text"],
     )
     expected_df["date"] = pd.to_datetime(expected_df["date"])
-    assert expected_df.equals(df)
+    assert normalize_chat_data(expected_df).equals(df)
 
 
 def test_prep_sms_data():
@@ -72,4 +85,253 @@ def test_prep_sms_data():
         columns=["date", "name", "text"],
     )
     expected_df["date"] = pd.to_datetime(expected_df["date"])
-    assert expected_df.equals(df)
+    assert normalize_chat_data(expected_df).equals(df)
+
+
+def test_prep_whatsapp_data_chunks():
+    wa_filename = pathlib.Path(__file__) / ".." / "test_data" / "wa_data.txt"
+    chunks = list(prep_whatsapp_data(wa_filename.resolve(), chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    df = normalize_chat_data(pd.concat(chunks, ignore_index=True))
+    assert prep_whatsapp_data(wa_filename.resolve()).equals(df)
+
+
+def test_prep_whatsapp_data_multiline():
+    wa_filename = pathlib.Path(__file__) / ".." / "test_data" / "wa_data_multiline.txt"
+    df = prep_whatsapp_data(wa_filename.resolve())
+    expected_df = pd.DataFrame(
+        [
+            [
+                "2019-12-24 21:06:00",
+                "Customer",
+                "Let me see...\nRed Leicester?\nTilsit?",
+            ],
+            [
+                "2019-12-24 21:07:00",
+                "Owner",
+                "I'm afraid we're fresh out of Red Leicester, sir.",
+            ],
+            [
+                "2019-12-25 10:16:00",
+                "Customer",
+                "Oh, never mind. How are you on Tilsit?",
+            ],
+        ],
+        columns=["date", "name", "text"],
+    )
+    expected_df["date"] = pd.to_datetime(expected_df["date"])
+    assert normalize_chat_data(expected_df).equals(df)
+
+
+def test_whatsapp_blocks_keep_messages_whole():
+    wa_filename = pathlib.Path(__file__) / ".." / "test_data" / "wa_data_multiline.txt"
+    expected_df = prep_whatsapp_data(wa_filename.resolve())
+    for blocksize in [1, 7, 50]:
+        frames = _iter_whatsapp_frames(wa_filename.resolve(), blocksize=blocksize)
+        df = pd.concat(frames, ignore_index=True)
+        assert expected_df.equals(normalize_chat_data(df))
+
+
+def test_infer_date_format():
+    cases = [
+        (["01/01/1970, 00:01", "13/01/1970, 00:02"], "%d/%m/%Y, %H:%M"),
+        (["12/24/19, 9:05 PM", "1/2/20, 10:15 am"], "%m/%d/%y, %I:%M %p"),
+        (["2019-12-24 21:05:30"], "%Y-%m-%d %H:%M:%S"),
+        (["2019-12-24T21:05:30.250"], "%Y-%m-%dT%H:%M:%S.%f"),
+        (["24.12.19, 21:05:30"], "%d.%m.%y, %H:%M:%S"),
+        (["01/01/1970, 00:01", "01/01/1970 00:01"], None),
+        (["yesterday"], None),
+    ]
+    for dates, expected in cases:
+        assert _infer_date_format(pd.Series(dates)) == expected
+
+
+def test_sniff_date_format_cache():
+    _DATE_FORMAT_CACHE.pop("test", None)
+    assert _sniff_date_format(pd.Series(["13/01/1970, 00:01"]), "test") == (
+        "%d/%m/%Y, %H:%M"
+    )
+    assert _DATE_FORMAT_CACHE["test"] == "%d/%m/%Y, %H:%M"
+    # ambiguous dates keep the cached format
+    assert _sniff_date_format(pd.Series(["01/01/1970, 00:01"]), "test") == (
+        "%d/%m/%Y, %H:%M"
+    )
+    # dates which don't match the cached format are sniffed again
+    assert _sniff_date_format(pd.Series(["01/13/1970, 00:01"]), "test") == (
+        "%m/%d/%Y, %H:%M"
+    )
+    assert _DATE_FORMAT_CACHE.pop("test") == "%m/%d/%Y, %H:%M"
+
+
+def test_to_datetime_reports_failures():
+    dates = pd.Series(["01/01/1970, 00:01", "not a date", "02/01/1970, 00:02"])
+    with pytest.warns(UserWarning, match="1 of 3 test dates could not be parsed"):
+        parsed = _to_datetime(dates, "%d/%m/%Y, %H:%M", "test")
+    assert parsed.isnull().tolist() == [False, True, False]
+    with pytest.warns(UserWarning, match="Could not infer the format"):
+        parsed = _to_datetime(dates, None, "test")
+    assert parsed.isnull().tolist() == [False, True, False]
+    parsed = _to_datetime(pd.Series(["1000", "2000"]), "ms", "test")
+    assert parsed.tolist() == [pd.Timestamp(1000, unit="ms"), pd.Timestamp(2, unit="s")]
+
+
+def test_prep_sms_data_chunks():
+    sms_filename = pathlib.Path(__file__) / ".." / "test_data" / "sms_data.xml"
+    chunks = list(prep_sms_data(sms_filename.resolve(), chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    df = normalize_chat_data(pd.concat(chunks, ignore_index=True))
+    assert prep_sms_data(sms_filename.resolve()).equals(df)
+
+
+def test_prep_sms_data_skips_mms_and_bad_dates():
+    sms_filename = pathlib.Path(__file__) / ".." / "test_data" / "sms_data_mms.xml"
+    with pytest.warns(UserWarning, match="1 of 3 sms dates could not be parsed"):
+        df = prep_sms_data(sms_filename.resolve())
+    assert df["name"].tolist() == ["Owner", "Customer"]
+    assert df["date"].tolist() == [
+        pd.Timestamp("1970-01-01 00:03:20"),
+        pd.Timestamp("1970-01-01 00:03:30"),
+    ]
+
+
+def test_prep_facebook_data_multiple_files():
+    fb_dir = (pathlib.Path(__file__) / ".." / "test_data" / "fb_thread").resolve()
+    expected_df = pd.DataFrame(
+        [
+            ["1970-01-01 00:00:15", "Owner", "I'm sorry, did you say 'peckish'?"],
+            ["1970-01-01 00:00:20", "Customer", "Yes, peckish."],
+            ["1970-01-01 00:00:21", "Owner", "Ah. Then you'll be wanting some cheese."],
+            ["1970-01-01 00:00:25", "Customer", "Yes, please!"],
+        ],
+        columns=["date", "name", "text"],
+    )
+    expected_df["date"] = pd.to_datetime(expected_df["date"])
+    expected_df = normalize_chat_data(expected_df)
+    assert expected_df.equals(prep_facebook_data(fb_dir, n_jobs=1))
+    assert expected_df.equals(prep_facebook_data(fb_dir, n_jobs=2))
+    assert expected_df.equals(prep_facebook_data(fb_dir / "message_*.json"))
+    assert expected_df.equals(prep_facebook_data(fb_dir, n_jobs=None))
+    with pytest.raises(FileNotFoundError):
+        prep_facebook_data(fb_dir / "no_such_file_*.json")
+
+
+def test_normalize_chat_data():
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["1970-01-01 00:01", "1970-01-01 00:02"] * 2),
+            "name": ["Owner", "Customer"] * 2,
+            "text": ["Peckish, sir?", None, "Eh?", "Esuriant."],
+        }
+    )
+    normalized = normalize_chat_data(df)
+    assert list(normalized["name"].cat.categories) == ["Customer", "Owner"]
+    assert normalized["name"].cat.codes.tolist() == [1, 0, 1, 0]
+    assert normalized["text"].isnull().tolist() == [False, True, False, False]
+    assert normalized["text"].fillna("").tolist() == df["text"].fillna("").tolist()
+    assert normalize_chat_data(normalized).equals(normalized)
+
+
+@pytest.fixture(params=[True, False], ids=["pyarrow", "pandas"])
+def csv_engine(request, monkeypatch):
+    if request.param and not load_data._HAS_PYARROW:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(load_data, "_HAS_PYARROW", request.param)
+
+
+def test_prep_csv_data(tmp_path, csv_engine):
+    csv_filename = tmp_path / "chat.csv"
+    csv_filename.write_text(
+        "id,name,text,date\n"
+        '0,Owner,"Peckish, sir?",1970-01-01 00:01:00\n'
+        '1,Customer,"Esuriant.\nI were all \'ungry-like!",1970-01-01 00:01:30\n'
+        "2,Owner,,1970-01-01 00:02:00\n"
+    )
+    df = prep_csv_data(csv_filename)
+    expected_df = pd.DataFrame(
+        [
+            ["1970-01-01 00:01:00", "Owner", "Peckish, sir?"],
+            ["1970-01-01 00:01:30", "Customer", "Esuriant.\nI were all 'ungry-like!"],
+            ["1970-01-01 00:02:00", "Owner", None],
+        ],
+        columns=["date", "name", "text"],
+    )
+    expected_df["date"] = pd.to_datetime(expected_df["date"])
+    pd.testing.assert_frame_equal(normalize_chat_data(expected_df), df)
+
+
+def test_prep_csv_data_chunks(csv_engine):
+    csv_filename = (
+        pathlib.Path(__file__) / ".." / "test_data" / "series_1.csv"
+    ).resolve()
+    df = prep_csv_data(csv_filename)
+    expected_df = pd.read_csv(csv_filename, parse_dates=["date"])
+    pd.testing.assert_frame_equal(
+        normalize_chat_data(expected_df[["date", "name", "text"]]), df
+    )
+    chunks = list(prep_csv_data(csv_filename, chunksize=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 747]
+    pd.testing.assert_frame_equal(
+        normalize_chat_data(pd.concat(chunks, ignore_index=True)), df
+    )
+    with pytest.raises(ValueError):
+        prep_csv_data(csv_filename, chunksize=0)
+
+
+def test_prep_csv_data_bad_dates(tmp_path, csv_engine):
+    csv_filename = tmp_path / "chat.csv"
+    csv_filename.write_text(
+        "date,name,text\n"
+        "01/01/1970 00:03,Owner,Come again?\n"
+        "yesterday,Customer,I want to buy some cheese.\n"
+        ",Owner,Sorry?\n"
+    )
+    with pytest.warns(UserWarning, match="1 of 3 csv dates could not be parsed"):
+        df = prep_csv_data(csv_filename, date_format="%d/%m/%Y %H:%M")
+    assert df["name"].tolist() == ["Owner"]
+    assert df["date"].tolist() == [pd.Timestamp("1970-01-01 00:03")]
+
+
+def test_prep_whatsapp_data_us_dates(tmp_path):
+    # none of the first 1000 dates says whether the day or month comes first
+    dates = pd.date_range("2012-01-01", periods=2000, freq="15min")
+    wa_filename = tmp_path / "chat.txt"
+    wa_filename.write_text(
+        "".join(
+            "{:%m/%d/%y, %H:%M} - Owner: Spam {}\n".format(date, i)
+            for i, date in enumerate(dates)
+        )
+    )
+    _DATE_FORMAT_CACHE.pop("whatsapp", None)
+    with pytest.warns(UserWarning, match="parsed as '%m/%d/%y, %H:%M'"):
+        df = prep_whatsapp_data(wa_filename)
+    assert df["date"].tolist() == dates.tolist()
+    _DATE_FORMAT_CACHE.pop("whatsapp", None)
+    with pytest.warns(UserWarning, match="parsed as '%m/%d/%y, %H:%M'"):
+        chunks = list(prep_whatsapp_data(wa_filename, chunksize=500))
+    df = pd.concat(chunks, ignore_index=True)
+    # no message is dropped, and those after the swap have the right dates
+    assert len(df) == len(dates)
+    assert df["date"].iloc[-500:].tolist() == dates[-500:].tolist()
+    _DATE_FORMAT_CACHE.pop("whatsapp", None)
+
+
+def test_prep_csv_data_us_dates(tmp_path, csv_engine):
+    dates = pd.date_range("2012-01-01", periods=2000, freq="15min")
+    csv_filename = tmp_path / "chat.csv"
+    pd.DataFrame(
+        {"date": dates.strftime("%m/%d/%Y %H:%M"), "name": "Owner", "text": "Spam"}
+    ).to_csv(csv_filename, index=False)
+    _DATE_FORMAT_CACHE.pop("csv", None)
+    with pytest.warns(UserWarning, match="parsed as '%m/%d/%Y %H:%M'"):
+        df = prep_csv_data(csv_filename)
+    assert df["date"].tolist() == dates.tolist()
+    _DATE_FORMAT_CACHE.pop("csv", None)
+
+
+def test_prep_facebook_data_no_pool_by_default(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("started a process pool")
+
+    monkeypatch.setattr(load_data, "ProcessPoolExecutor", no_pool)
+    fb_dir = (pathlib.Path(__file__) / ".." / "test_data" / "fb_thread").resolve()
+    assert len(prep_facebook_data(fb_dir)) == 4
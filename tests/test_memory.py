@@ -0,0 +1,63 @@
+"""
+Test that chats aggregated a chunk at a time use less memory than whole ones.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.synthetic import write_chat
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = """
+import json, sys
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from benchmarks.suite import _measure_peak
+from chatviz import ChatStats, visualize_chat
+from chatviz.load_data import prep_whatsapp_data
+
+path, chunksize = sys.argv[1], int(sys.argv[2])
+
+def run(path, chunksize):
+    if chunksize:
+        stats = ChatStats.from_chunks(prep_whatsapp_data(path, chunksize=chunksize))
+    else:
+        stats = ChatStats(prep_whatsapp_data(path))
+    fig = visualize_chat(stats, "Memory", timeline_color="C0")
+    fig.canvas.draw()
+    plt.close(fig)
+
+# drawn once first, so that the fonts and caches it loads aren't counted
+run("tests/test_data/wa_data.txt", chunksize)
+print(json.dumps(_measure_peak(lambda: run(path, chunksize))))
+"""
+
+
+def peak_bytes(path, chunksize):
+    """
+    Returns the peak memory of loading and drawing the chat at path in a new
+    interpreter, a chunk at a time if chunksize isn't 0.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE, str(path), str(chunksize)],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+        env=env,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_chunked_peak_memory(tmp_path):
+    path = tmp_path / "chat.txt"
+    write_chat("whatsapp", path, 300000)
+    whole = peak_bytes(path, 0)
+    chunked = peak_bytes(path, 5000)
+    # about 100MB and 13MB here
+    assert chunked < 0.25 * whole
@@ -1,15 +1,18 @@
 """
 test the individual plots on some dummy data.
 """
+
 from chatviz.plotting import (
     plot_donuts,
     plot_timeline,
     plot_days_radar,
     plot_hours_radar,
+    plot_hour_weekday_heatmap,
     plot_words,
     plot_legend,
     plot_reply_times,
 )
+from chatviz.stats import ChatStats
 from chatviz.utils import STOPWORDS, _map_colors, load_example_chat_data
 import pandas as pd
 import pathlib
@@ -61,6 +64,28 @@ def test_nonstacked_timeline():
     return plt.gcf()
 
 
+def test_dense_timeline_is_drawn_as_steps():
+    df = generate_dummy_data()
+    ax = plot_timeline(df, stacked=True, freq="H", tick_step=500)
+    # one filled step patch per person, rather than a bar per hour each
+    assert len(ax.patches) == df["name"].nunique()
+    assert ax.patches[-1].get_data().values.sum() == df["text"].count()
+    plt.close(ax.figure)
+    ax = plot_timeline(df, stacked=False, freq="W")
+    # few enough bins for bars
+    assert len(ax.patches) == len(ChatStats(df).timeline("W"))
+    plt.close(ax.figure)
+
+
+def test_nonstacked_timeline_counts_unnamed():
+    df = generate_dummy_data()
+    df.loc[::5, "name"] = None
+    ax = plot_timeline(df, stacked=False, freq="W")
+    expected = df.resample("W", on="date")["text"].count()
+    assert [p.get_height() for p in ax.patches] == expected.tolist()
+    plt.close(ax.figure)
+
+
 @pytest.mark.mpl_image_compare(style="default")
 def test_days_radar():
     df = generate_dummy_data()
@@ -75,6 +100,23 @@ def test_hours_radar():
     return plt.gcf()
 
 
+def test_hour_weekday_heatmap():
+    df = generate_dummy_data()
+    stats = ChatStats(df)
+    plot_hours_radar(stats)
+    plot_days_radar(stats)
+    ax = plot_hour_weekday_heatmap(stats, name="John Cleese")
+    # counted once for the radars and the heatmap
+    assert "hour_weekday" in stats._cache
+    john = df[(df["name"] == "John Cleese") & df["text"].notnull()]
+    expected = pd.crosstab(john["date"].dt.dayofweek, john["date"].dt.hour)
+    image = ax.get_images()[0].get_array()
+    assert image.shape == (7, 24)
+    assert (image[expected.index][:, expected.columns] == expected.to_numpy()).all()
+    assert image.sum() == len(john)
+    plt.close(ax.figure)
+
+
 @pytest.mark.mpl_image_compare(style="default")
 def test_plot_words():
     df = generate_dummy_data(3)
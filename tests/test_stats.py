@@ -0,0 +1,457 @@
+"""
+Test the per person statistics shared between the plots.
+"""
+
+import re
+import tracemalloc
+from collections import Counter
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from chatviz import stats as stats_module
+from chatviz import visualize_chat
+from chatviz.load_data import normalize_chat_data
+from chatviz.plotting import plot_donuts, plot_words
+from chatviz.stats import ChatStats, SpaceSaving
+from chatviz.utils import STOPWORDS, load_example_chat_data
+
+
+def test_counts():
+    df = load_example_chat_data()
+    stats = ChatStats(df)
+    assert stats.names == sorted(set(df["name"]))
+    assert stats.message_counts.sum() == df["text"].count()
+    assert sorted(stats.message_counts.index) == stats.names
+    pd.testing.assert_series_equal(
+        stats.hour_counts.sum(),
+        df.groupby(df["date"].dt.hour)["text"].count(),
+        check_names=False,
+        check_dtype=False,
+    )
+    assert stats.weekday_counts.sum().sum() == df["text"].count()
+    assert stats.timeline("W").sum().sum() == df["text"].count()
+
+
+@pytest.mark.parametrize(
+    "freq", ["MS", "W", "W-MON", "D", "2D", "12H", "M", "SM", "30min", "7T"]
+)
+def test_timeline_matches_resample(freq):
+    df = load_example_chat_data()
+    expected = (
+        df.groupby([pd.Grouper(key="date", freq=freq), "name"])["text"]
+        .count()
+        .unstack("name", fill_value=0)
+        .resample(freq)
+        .sum()
+    )
+    timeline = ChatStats(df).timeline(freq)
+    assert timeline.index.equals(expected.index)
+    assert timeline.columns.tolist() == sorted(expected.columns)
+    assert (timeline[sorted(expected.columns)] == expected.sort_index(axis=1)).all(
+        axis=None
+    )
+
+
+@pytest.mark.parametrize("freq", ["MS", "W", "D", "30min"])
+def test_timeline_total_matches_resample(freq):
+    df = load_example_chat_data()
+    # messages without a name or text, which only the total counts or spans
+    df["name"] = df["name"].where(df.index % 7 != 0)
+    df["text"] = df["text"].where(df.index % 11 != 0)
+    expected = df.resample(freq, on="date")["text"].count()
+    pd.testing.assert_series_equal(
+        ChatStats(df).timeline(freq, total=True), expected, check_freq=False
+    )
+
+
+def test_hour_weekday_counts():
+    df = load_example_chat_data()
+    stats = ChatStats(df)
+    counts = stats.hour_weekday_counts
+    expected = df.groupby([df["name"], df["date"].dt.dayofweek, df["date"].dt.hour])[
+        "text"
+    ].count()
+    assert counts.stack()[expected.index].tolist() == expected.tolist()
+    assert counts.to_numpy().sum() == df["text"].count()
+    # the radars are slices of the same counts
+    by_hour = counts.groupby(level="name").sum()
+    pd.testing.assert_frame_equal(
+        stats.hour_counts, by_hour.where(by_hour != 0), check_names=False
+    )
+    by_day = counts.sum(axis=1).unstack("weekday")
+    pd.testing.assert_frame_equal(
+        stats.weekday_counts, by_day.where(by_day != 0), check_names=False
+    )
+
+
+def test_top_words():
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2020-01-01 10:00", "2020-01-01 11:00"]),
+            "name": ["Owner", "Owner"],
+            "text": ["The cheese, the CHEESE!", "Is the cheese runny?"],
+        }
+    )
+    stats = ChatStats(df)
+    assert stats.top_words("Owner", 2) == [("the", 3), ("cheese", 3)]
+    assert stats.top_words("Owner", 2, stopwords=["The"]) == [
+        ("cheese", 3),
+        ("is", 1),
+    ]
+    assert stats.top_words("Customer") == []
+
+
+def test_plots_reuse_stats():
+    stats = ChatStats(load_example_chat_data())
+    plot_donuts(stats)
+    plot_words(stats, stopwords=STOPWORDS)
+    cached = dict(stats._cache)
+    fig = visualize_chat(
+        stats, "Flying Circus", timeline_color="C0", stopwords=STOPWORDS
+    )
+    for key, value in cached.items():
+        assert stats._cache[key] is value
+    plt.close("all")
+    assert len(fig.axes) > 0
+
+
+@pytest.mark.parametrize("chunksize", [2, 2**20])
+def test_word_and_char_counts(monkeypatch, chunksize):
+    monkeypatch.setattr(stats_module, "_LENGTHS_CHUNKSIZE", chunksize)
+    df = load_example_chat_data()
+    text = df["text"].astype(object)
+    text.iloc[:3] = [None, "naïve café, 2 ways!", "  \n "]
+    df = normalize_chat_data(df.assign(text=text))
+    stats = ChatStats(df)
+    text = df["text"].fillna("").astype(object)
+    expected_words = text.apply(
+        lambda i: len(re.sub(r"[^a-zA-Z0-9]+", " ", i).strip().split())
+    )
+    expected_chars = text.str.len()
+    assert (stats.message_lengths["words"] == expected_words).all()
+    assert (stats.message_lengths["chars"] == expected_chars).all()
+    for name in stats.names:
+        assert stats.word_counts[name] == expected_words[df["name"] == name].sum()
+        assert stats.char_counts[name] == expected_chars[df["name"] == name].sum()
+    # text which pyarrow can't hold is counted the same
+    assert (stats_module._count_words(text) == expected_words).all()
+
+
+def _loop_reply_times(df):
+    # the loop ChatStats.reply_times replaced
+    reply_times = []
+    last_time = None
+    last_person = None
+    for d, n in df[["date", "name"]].values:
+        if last_time is None:
+            last_time = d
+            last_person = n
+            continue
+        if n != last_person:
+            reply_times.append([d - last_time, n])
+            last_person = n
+            last_time = d
+    reply_df = pd.DataFrame(reply_times, columns=["reply_time", "name"])
+    reply_df["reply_seconds"] = reply_df["reply_time"].dt.total_seconds()
+    return reply_df
+
+
+def test_reply_times():
+    df = load_example_chat_data()
+    stats = ChatStats(df)
+    replies = _loop_reply_times(df)
+    expected = replies.groupby("name")["reply_seconds"].mean() / 3600
+    expected.name = "reply_hours"
+    pd.testing.assert_series_equal(stats.reply_times, expected, check_exact=True)
+    pd.testing.assert_series_equal(
+        stats.reply_time_quantiles(),
+        replies.groupby("name")["reply_seconds"].median() / 3600,
+        check_names=False,
+    )
+    quantiles = stats.reply_time_quantiles([0.1, 0.9])
+    assert list(quantiles.columns) == [0.1, 0.9]
+    assert (quantiles[0.1] <= quantiles[0.9]).all()
+    for name, hours in stats.reply_distribution.items():
+        expected_hours = replies.loc[replies["name"] == name, "reply_seconds"] / 3600
+        np.testing.assert_allclose(hours, np.sort(expected_hours))
+
+
+def test_reply_times_no_replies():
+    df = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2020-01-01 10:00", "2020-01-01 11:00"]),
+            "name": ["Owner", "Owner"],
+            "text": ["Hello?", "Anyone?"],
+        }
+    )
+    stats = ChatStats(df)
+    assert stats.reply_times is None
+    assert stats.reply_time_quantiles() is None
+    assert stats.reply_distribution == {}
+
+
+@pytest.mark.parametrize("chunksize", [7, 10000])
+def test_word_counters(monkeypatch, chunksize):
+    monkeypatch.setattr(stats_module, "_WORDS_CHUNKSIZE", chunksize)
+    df = load_example_chat_data()
+    expected = {name: Counter() for name in set(df["name"])}
+    for name, text in zip(df["name"], df["text"].fillna("")):
+        expected[name].update(re.sub(r"[^a-z_]+", " ", text.lower()).split())
+    counters = ChatStats(df).word_counters
+    assert list(counters) == sorted(expected)
+    for name, counter in counters.items():
+        assert counter == expected[name]
+        # ties are broken by the first use, as before
+        assert list(counter) == list(expected[name])
+
+
+def test_word_counters_memory(monkeypatch):
+    monkeypatch.setattr(stats_module, "_WORDS_CHUNKSIZE", 500)
+    df = load_example_chat_data()
+    # same vocabulary, ten times the words
+    big = normalize_chat_data(pd.concat([df] * 10, ignore_index=True))
+    peaks = []
+    for chat in (df, big):
+        tracemalloc.start()
+        ChatStats(chat).word_counters
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < 3 * peaks[0]
+
+
+@pytest.mark.parametrize("capacity", [1, 20, 200])
+def test_space_saving_bounds(capacity):
+    df = load_example_chat_data()
+    exact = ChatStats(df).word_counters
+    approximate = ChatStats(df, max_words=capacity).word_counters
+    assert list(approximate) == list(exact)
+    for name, words in approximate.items():
+        true = exact[name]
+        total = sum(true.values())
+        assert words.total == total
+        assert len(words) == min(capacity, len(true))
+        for word, count in words.items():
+            assert count - words.error(word) <= true[word] <= count
+            assert words.error(word) <= total / capacity
+        for word, count in true.items():
+            if count > total / capacity:
+                assert word in words
+            else:
+                assert word in words or count <= words.error(word)
+
+
+def test_space_saving_top_words():
+    df = load_example_chat_data()
+    exact = ChatStats(df)
+    # the most common words are used far more than N / max_words times
+    approximate = ChatStats(df, max_words=200)
+    for name in exact.names:
+        assert approximate.top_words(name, 5) == exact.top_words(name, 5)
+    # with room for every word, the counts are exact
+    approximate = ChatStats(df, max_words=2000)
+    for name in exact.names:
+        expected = exact.top_words(name, 10, stopwords=STOPWORDS)
+        assert approximate.top_words(name, 10, stopwords=STOPWORDS) == expected
+
+
+def test_space_saving_errors():
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+    words = SpaceSaving(3)
+    words.update({"spam": 4, "eggs": 2})
+    assert words["spam"] == 4
+    assert words["ham"] == 0
+    assert words.error("ham") == 0
+    words.update(["ham", "sausage"])
+    assert words.most_common() == [("spam", 4), ("eggs", 2), ("sausage", 2)]
+    assert words.error("sausage") == 1
+
+
+def test_merge_replies():
+    df = pd.DataFrame(
+        {
+            "date": pd.date_range("2020-01-01", periods=8, freq="37min"),
+            "name": ["a", "a", "b", None, None, "b", "b", "a"],
+        }
+    )
+    expected = stats_module._reply_intervals(df)
+    for split in range(len(df) + 1):
+        merged = stats_module._merge_replies(
+            stats_module._reply_intervals(df.iloc[:split]),
+            stats_module._reply_intervals(df.iloc[split:]),
+        )
+        pd.testing.assert_frame_equal(merged["replies"], expected["replies"])
+        assert merged["first"] == expected["first"]
+        assert merged["last"] == expected["last"]
+
+
+@pytest.mark.parametrize("max_words", [None, 300])
+def test_parallel(monkeypatch, max_words):
+    monkeypatch.setattr(stats_module, "_PARTITION_MIN_SIZE", 500)
+    df = load_example_chat_data()
+    serial = ChatStats(df, max_words=max_words)
+    parallel = ChatStats(df, max_words=max_words, n_jobs=4)
+    assert parallel._n_partitions() == 4
+    for attribute in [
+        "message_counts",
+        "word_counts",
+        "char_counts",
+        "reply_times",
+    ]:
+        pd.testing.assert_series_equal(
+            getattr(parallel, attribute), getattr(serial, attribute), check_exact=True
+        )
+    for attribute in ["hour_counts", "weekday_counts"]:
+        pd.testing.assert_frame_equal(
+            getattr(parallel, attribute), getattr(serial, attribute)
+        )
+    for freq in ["MS", "W", "D", "30min"]:
+        pd.testing.assert_frame_equal(parallel.timeline(freq), serial.timeline(freq))
+    pd.testing.assert_frame_equal(
+        parallel.reply_time_quantiles([0.1, 0.5]),
+        serial.reply_time_quantiles([0.1, 0.5]),
+    )
+    for name, counter in serial.word_counters.items():
+        merged = parallel.word_counters[name]
+        if max_words is None:
+            assert list(merged.items()) == list(counter.items())
+        else:
+            assert merged.total == counter.total
+            true = ChatStats(df).word_counters[name]
+            for word, count in merged.items():
+                assert count - merged.error(word) <= true[word] <= count
+                assert merged.error(word) <= merged.total / max_words
+
+
+@pytest.mark.parametrize("max_words", [None, 300])
+def test_update(tmpdir, max_words):
+    df = load_example_chat_data()
+    expected = ChatStats(df, max_words=max_words)
+    filename = str(tmpdir.join("stats.npz"))
+    stats = ChatStats(df.iloc[:1000], max_words=max_words)
+    stats.save(filename)
+    stats = ChatStats.load(filename).update(df.iloc[1000:2000])
+    stats.save(filename)
+    stats = ChatStats.load(filename).update(df.iloc[2000:])
+    assert stats.names == expected.names
+    for attribute in [
+        "message_counts",
+        "word_counts",
+        "char_counts",
+    ]:
+        pd.testing.assert_series_equal(
+            getattr(stats, attribute), getattr(expected, attribute), check_exact=True
+        )
+    # the reply times are summed, so their means only match to rounding
+    pd.testing.assert_series_equal(stats.reply_times, expected.reply_times, rtol=1e-12)
+    with pytest.raises(ValueError, match="mean reply times"):
+        stats.reply_time_quantiles([0.5])
+    for attribute in ["hour_counts", "weekday_counts"]:
+        pd.testing.assert_frame_equal(
+            getattr(stats, attribute), getattr(expected, attribute)
+        )
+    pd.testing.assert_frame_equal(stats.timeline("W"), expected.timeline("W"))
+    if max_words is None:
+        assert stats.word_counters == expected.word_counters
+    else:
+        for name, words in stats.word_counters.items():
+            true = ChatStats(df).word_counters[name]
+            for word, count in words.items():
+                assert count - words.error(word) <= true[word] <= count
+    # the messages are gone, so only aggregates that can be merged are left
+    with pytest.raises(ValueError):
+        stats.timeline("30min")
+    with pytest.raises(ValueError):
+        stats.message_lengths
+    fig = visualize_chat(stats, "Flying Circus", timeline_color="C0")
+    plt.close(fig)
+
+
+def test_saved_replies_dont_grow(tmpdir):
+    df = load_example_chat_data()
+    filename = str(tmpdir.join("stats.npz"))
+    ChatStats(df.iloc[:500]).save(filename)
+    sizes = []
+    for start in range(500, len(df), 500):
+        ChatStats.load(filename).update(df.iloc[start : start + 500]).save(filename)
+        with np.load(filename) as data:
+            sizes.append(len(data["reply_ns"]))
+    n_names = len(ChatStats(df).names)
+    assert max(sizes) <= n_names + 1
+    pd.testing.assert_series_equal(
+        ChatStats.load(filename).reply_times, ChatStats(df).reply_times, rtol=1e-12
+    )
+
+
+def test_load_version(tmpdir, monkeypatch):
+    filename = str(tmpdir.join("stats.npz"))
+    ChatStats(load_example_chat_data()).save(filename)
+    monkeypatch.setattr(stats_module, "_STATE_VERSION", -1)
+    with pytest.raises(ValueError, match="incompatible"):
+        ChatStats.load(filename)
+
+
+@pytest.mark.parametrize("chunksize", [1, 7, 500, 10**6])
+def test_from_chunks(chunksize):
+    df = load_example_chat_data()
+    expected = ChatStats(df)
+    chunks = (df.iloc[i : i + chunksize] for i in range(0, len(df), chunksize))
+    stats = ChatStats.from_chunks(chunks)
+    assert stats.names == expected.names
+    for attribute in ["message_counts", "word_counts", "char_counts"]:
+        pd.testing.assert_series_equal(
+            getattr(stats, attribute), getattr(expected, attribute), check_exact=True
+        )
+    pd.testing.assert_series_equal(stats.reply_times, expected.reply_times, rtol=1e-12)
+    for attribute in ["hour_counts", "weekday_counts"]:
+        pd.testing.assert_frame_equal(
+            getattr(stats, attribute), getattr(expected, attribute)
+        )
+    pd.testing.assert_frame_equal(stats.timeline("W"), expected.timeline("W"))
+    assert stats.word_counters == expected.word_counters
+    # each person's replies are only summed
+    assert len(stats._replies["replies"]) <= len(stats.names) + 1
+    with pytest.raises(ValueError, match="mean reply times"):
+        stats.reply_time_quantiles([0.5])
+    with pytest.raises(ValueError, match="mean reply times"):
+        stats.reply_distribution
+
+
+def test_from_chunks_empty():
+    stats = ChatStats.from_chunks(iter([]))
+    assert stats.names == []
+    assert stats.message_counts.empty
+
+
+def test_from_chunks_save_and_update(tmpdir):
+    df = load_example_chat_data()
+    expected = ChatStats(df)
+    filename = str(tmpdir.join("stats.npz"))
+    chunks = (df.iloc[i : i + 1000] for i in range(0, 2000, 1000))
+    ChatStats.from_chunks(chunks).save(filename)
+    stats = ChatStats.load(filename).update(df.iloc[2000:])
+    assert len(stats._replies["replies"]) <= len(stats.names) + 1
+    pd.testing.assert_series_equal(
+        stats.message_counts, expected.message_counts, check_exact=True
+    )
+    pd.testing.assert_series_equal(stats.reply_times, expected.reply_times, rtol=1e-12)
+
+
+def test_from_chunks_visualize_chat():
+    df = load_example_chat_data()
+    figures = [
+        visualize_chat(stats, "Flying Circus", timeline_color="C0")
+        for stats in [
+            ChatStats(df),
+            ChatStats.from_chunks(df.iloc[i : i + 300] for i in range(0, len(df), 300)),
+        ]
+    ]
+    images = []
+    for fig in figures:
+        fig.canvas.draw()
+        images.append(np.asarray(fig.canvas.buffer_rgba()))
+        plt.close(fig)
+    np.testing.assert_array_equal(images[0], images[1])